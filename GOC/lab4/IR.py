@@ -1,3 +1,5 @@
+import sys
+
 NULL = "null expression"
 PHI = "phi function"
 ASSIGN = "assign"
@@ -5,11 +7,23 @@ RETURN = 'return'
 CMP = 'i_cmp_ne_0'
 
 
+def is_variable(argument):
+    # Аргумент является именем переменной, а не числом или вложенным выражением
+    return isinstance(argument, str) and (argument[:1].isalpha() or argument[:1] == "_")
+
+
+def intern(argument):
+    # Одинаковые имена операндов хранятся в одном экземпляре строки
+    return sys.intern(argument) if isinstance(argument, str) else argument
+
+
 class IR:
+    __slots__ = ("type", "value", "arguments", "bin_op")
+
     def __init__(self, type, value):
         # Конструктор класса IR. Принимает тип операции (type) и значение (value).
         self.type = type
-        self.value = value
+        self.value = sys.intern(value)
         self.arguments = []
         self.bin_op = None
 
@@ -18,38 +32,46 @@ class IR:
         # Метод для создания пустого выражения IR.
         return IR(NULL, "")
 
+    def copy(self):
+        expr = IR(self.type, self.value)
+        expr.arguments = list(self.arguments)
+        expr.bin_op = self.bin_op
+        return expr
+
     def add_argument(self, argument):
         # Добавляет аргумент к выражению IR.
-        self.arguments.append(argument)
+        self.arguments.append(intern(argument))
 
     def add_bin_op(self, op):
         # Добавляет бинарный оператор к выражению IR.
         self.bin_op = op
 
+    def to_dict(self):
+        # Описание оператора из простых типов (для JSON)
+        return {"type": self.type, "value": self.value,
+                "arguments": [str(arg) for arg in self.arguments], "bin_op": self.bin_op}
+
+    @staticmethod
+    def from_dict(data):
+        expr = IR(data["type"], data["value"])
+        for arg in data["arguments"]:
+            expr.add_argument(arg)
+        if data["bin_op"] is not None:
+            expr.add_bin_op(data["bin_op"])
+        return expr
+
+    def operands(self):
+        # Строка операндов: один аргумент или "a op b"
+        if self.bin_op is None:
+            return str(self.arguments[0])
+        return "{} {} {}".format(self.arguments[0], self.bin_op, self.arguments[1])
+
     def __str__(self):
         if self.type == PHI:
-            result = self.value + "= phi ("
-            for arg in self.arguments:
-                result += arg + ", "
-            return result[:-2] + ")"
+            return "{}= phi ({})".format(self.value, ", ".join(map(str, self.arguments)))
         if self.type == ASSIGN:
-            result = self.value + " = "
-            if self.bin_op is None:
-                result += self.arguments[0]
-            else:
-                result += self.arguments[0] + " " + self.bin_op + " " + self.arguments[1]
-            return result
+            return self.value + " = " + self.operands()
         if self.type == RETURN:
-            result = "return "
-            if self.bin_op is None:
-                result += self.arguments[0]
-            else:
-                result += self.arguments[0] + " " + self.bin_op + " " + self.arguments[1]
-            return result
+            return "return " + self.operands()
         if self.type == CMP:
-            result = CMP + " "
-            if self.bin_op is None:
-                result += self.arguments[0]
-            else:
-                result += self.arguments[0] + " " + self.bin_op + " " + self.arguments[1]
-            return result
+            return CMP + " " + self.operands()
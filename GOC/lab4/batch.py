@@ -0,0 +1,112 @@
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from compiler import compile_source, open_cache
+from dot import dump_dot
+from optimize import parse_passes
+
+
+def collect_inputs(paths, pattern="*.txt"):
+    # Каталоги раскрываются в отсортированный список файлов по шаблону
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            result.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            result.append(path)
+    return result
+
+
+def output_paths(paths, out_dir, compress=False):
+    # Выходные файлы повторяют пути входных относительно их общего каталога,
+    # поэтому dirA/prog.txt и dirB/prog.txt не пишут в один файл.
+    # Возвращает пары (путь, выходной файл) и тройки (путь, выходной файл, занявший его путь)
+    # для входов, выходной файл которых уже выбран для другого входа.
+    if not paths:
+        return [], []
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    suffix = ".dot.gz" if compress else ".dot"
+    targets = []
+    collisions = []
+    owners = {}
+    for path in paths:
+        relative = os.path.relpath(os.path.abspath(path), base)
+        out_path = os.path.join(out_dir, os.path.splitext(relative)[0] + suffix)
+        key = os.path.normcase(os.path.abspath(out_path))
+        if key in owners:
+            collisions.append((path, out_path, owners[key]))
+        else:
+            owners[key] = path
+            targets.append((path, out_path))
+    return targets, collisions
+
+
+def compile_file(path, out_path, cache_dir=None, compress=False, passes=()):
+    # Компиляция одного файла в рабочем процессе.
+    # Возвращает (путь, выходной файл, время, ошибка); исключения не выходят наружу,
+    # чтобы одна ошибка не останавливала весь пакет.
+    start = time.perf_counter()
+    messages = io.StringIO()
+    try:
+        with open(path) as file:
+            graph = compile_source(file, open_cache(cache_dir), passes, messages=messages)
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        dump_dot(graph, out_path, compress)
+        return path, out_path, time.perf_counter() - start, None
+    except Exception as e:
+        # В текст ошибки попадают и сообщения лексера
+        detail = " ".join(part for part in (str(e), messages.getvalue().strip()) if part)
+        error = type(e).__name__ + (": " + detail if detail else "")
+        return path, None, time.perf_counter() - start, error
+
+
+def run_batch(paths, out_dir, jobs=None, out=sys.stdout, cache_dir=None, compress=False, passes=()):
+    # Компилирует все файлы в пуле процессов, печатает время по каждому файлу.
+    # Возвращает число файлов с ошибками.
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    # Файлы отдаются процессам пачками, чтобы не платить за передачу каждого отдельно
+    chunksize = max(1, len(paths) // (jobs * 4))
+    failures = 0
+    start = time.perf_counter()
+    targets, collisions = output_paths(paths, out_dir, compress)
+    for path, out_path, owner in collisions:
+        # Второй вход с тем же выходным файлом не компилируется, чтобы не перезаписать первый
+        failures += 1
+        print(f"FAIL\t0.0000s\t{path}: output {out_path} is already used by {owner}", file=out)
+    sources = [path for path, out_path in targets]
+    out_paths = [out_path for path, out_path in targets]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for path, out_path, elapsed, error in executor.map(compile_file, sources, out_paths, repeat(cache_dir),
+                                                             repeat(compress), repeat(passes),
+                                                             chunksize=chunksize):
+            if error is None:
+                print(f"ok\t{elapsed:.4f}s\t{path} -> {out_path}", file=out)
+            else:
+                failures += 1
+                print(f"FAIL\t{elapsed:.4f}s\t{path}: {error}", file=out)
+    print(f"{len(paths) - failures} compiled, {failures} failed, "
+          f"{time.perf_counter() - start:.2f}s total, {jobs} processes", file=out)
+    return failures
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Пакетная компиляция программ в SSA-графы")
+    arg_parser.add_argument("inputs", nargs="+", help="файлы или каталоги с программами")
+    arg_parser.add_argument("-o", "--output", default="out", help="каталог для .dot файлов")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="число процессов")
+    arg_parser.add_argument("--pattern", default="*.txt", help="шаблон файлов в каталогах")
+    arg_parser.add_argument("--cache", help="каталог кэша скомпилированных графов")
+    arg_parser.add_argument("--gzip", action="store_true", help="сжимать выходные файлы (.dot.gz)")
+    arg_parser.add_argument("--passes", default="", type=parse_passes,
+                            help="проходы оптимизации через запятую или all")
+    args = arg_parser.parse_args()
+    files = collect_inputs(args.inputs, args.pattern)
+    sys.exit(1 if run_batch(files, args.output, args.jobs, cache_dir=args.cache, compress=args.gzip,
+                            passes=args.passes) else 0)
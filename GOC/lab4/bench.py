@@ -0,0 +1,536 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+import IR
+import binary
+from builder import Builder
+from compact import CompactGraph
+from context import Context, version_name
+from graph import Graph
+from incremental import IncrementalCompiler
+from compiler import compile_source
+from dot import dump_dot
+from lexer import Lexer
+from native import compile_graph
+from nodes import BinOp
+from parser import MINUS, PLUS, Parser
+from copyprop import propagate_copies
+from dce import eliminate_dead_code
+from gvn import number_values
+from optimize import PASSES, optimize
+from sccp import propagate_constants
+from programs import (dfp_fixpoint, generate_program, loop_program, many_variables_program, program_over,
+                      random_cfg, random_program, run_graph)
+from vm import ADD, JMP, JNZ, MOV, SUB, Program
+
+# Замеры времени и памяти. Проверки правильности - в test_compiler.py
+
+
+class RecursiveParser(Parser):
+    # Прежний разбор выражений для сравнения
+    def parse_bin(self, min_precedence=1):
+        return self.parse_bin_r(self.parse_atom())
+
+    def parse_bin_r(self, left):
+        # Прежний разбор: рекурсия на каждый оператор и правоассоциативное дерево.
+        if self.curToken.token_type != PLUS and self.curToken.token_type != MINUS:
+            return left
+        op = self.curToken.value
+        self.next_token()
+        right = self.parse_atom()
+        if self.curToken.token_type == PLUS or self.curToken.token_type == MINUS:
+            right = self.parse_bin_r(right)
+        return BinOp(op, left, right)
+
+
+def measure(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def token_tuples(tokens):
+    return [(t.token_type, t.value, t.line, t.position) for t in tokens]
+
+
+def bench_lexer(statements):
+    text = generate_program(statements) + "$"
+    rules_time, rules_tokens = measure(lambda: token_tuples(Lexer(text, scanner=False).tokenize()))
+    scan_time, scan_tokens = measure(lambda: token_tuples(Lexer(text).tokenize()))
+    print(f"lexer: {len(text) / 2 ** 20:.1f} MB, {len(scan_tokens)} tokens, "
+          f"rules {rules_time:.2f}s, scanner {scan_time:.2f}s, x{rules_time / scan_time:.1f}")
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stream(statements):
+    # Пиковая память при чтении файла целиком и при потоковом разборе
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+        file.write(generate_program(statements) + "$")
+        path = file.name
+    try:
+        def eager():
+            with open(path) as f:
+                for _ in Lexer(f.read()).tokenize():
+                    pass
+
+        def lazy():
+            with open(path) as f:
+                for _ in Lexer(f, lazy=True).tokenize():
+                    pass
+
+        print(f"stream: eager peak {peak_memory(eager) / 2 ** 20:.1f} MB, "
+              f"lazy peak {peak_memory(lazy) / 2 ** 20:.2f} MB")
+    finally:
+        os.remove(path)
+
+
+def deep_program(blocks):
+    # Длинная цепочка условных операторов: глубокое дерево доминаторов и длинные пути в графе
+    lines = ["main {", "    a = 1", "    b = 2"]
+    for i in range(blocks):
+        lines.append("    if (a) {")
+        lines.append("        b = b + a")
+        lines.append("    }")
+    lines.append("    return b")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def bench_deep():
+    for blocks in (5000, 10000, 20000):
+        graph_time, graph = measure(lambda: compile_source(deep_program(blocks)))
+        print(f"deep: {blocks} if statements, {len(graph.vertexes)} blocks, {graph_time:.2f}s")
+
+
+def bench_dominators():
+    for size in (250, 500, 1000, 2000, 100000):
+        graph = random_cfg(size, size * 2)
+        fast_time, _ = measure(graph.build_dominators_tree)
+        line = f"dominators: {size} blocks, iterative {fast_time:.3f}s"
+        if size <= 2000:
+            graph.dfs()
+            naive_time, _ = measure(graph.build_dominators_tree_naive)
+            line += f", naive {naive_time:.3f}s"
+        print(line)
+
+
+def bench_dynamic_dominators():
+    # Отсечение ветки условного оператора и ее возврат в скомпилированной программе
+    for statements in (4000, 20000):
+        text = many_variables_program(50, statements)
+        graph, full_graph = compile_source(text), compile_source(text)
+        branches = [v.index for v in graph.vertexes if len(v.output_vertexes) == 2][:50]
+        timing = {"remove": 0, "insert": 0}
+
+        def prune_and_restore(graph, remove, insert):
+            for i in branches:
+                u = graph.vertexes[i]
+                v = u.output_vertexes[1]
+                phis = [stmt for stmt in v.block if stmt.type == IR.PHI]
+                operands = [stmt.arguments[v.pred_slots[u]] for stmt in phis]
+                timing["remove"] += measure(lambda: remove(u, v))[0]
+                timing["insert"] += measure(lambda: insert(u, v))[0]
+                for stmt, operand in zip(phis, operands):
+                    stmt.arguments.append(operand)
+
+        def unlink(u, v):
+            u.remove_output_connector(v)
+            slot = v.remove_input_connector(u)
+            for stmt in v.block:
+                if stmt.type == IR.PHI:
+                    del stmt.arguments[slot]
+            full_graph.build_dominators_tree()
+            full_graph.make_DF()
+
+        def link(u, v):
+            u.add_output_connector(v)
+            v.add_input_connector(u)
+            full_graph.build_dominators_tree()
+            full_graph.make_DF()
+        prune_and_restore(full_graph, unlink, link)
+        full_time = timing["remove"] + timing["insert"]
+        timing = {"remove": 0, "insert": 0}
+        prune_and_restore(graph, graph.remove_edge, graph.insert_edge)
+        print(f"dynamic: {len(graph.vertexes)} blocks, {len(branches)} branches pruned and restored, "
+              f"full recomputation {full_time:.2f}s, incremental removal {timing['remove']:.3f}s, "
+              f"insertion {timing['insert']:.4f}s")
+
+
+def bench_phi(blocks, variables):
+    graph = random_cfg(blocks, blocks // 2)
+    graph.build_dominators_tree()
+    graph.make_DF()
+    rnd = random.Random(1)
+    def_sets = [set(rnd.sample(graph.vertexes, 20)) for _ in range(variables)]
+    old_time, old = measure(lambda: [dfp_fixpoint(graph, s) for s in def_sets])
+    new_time, new = measure(lambda: [graph.make_dfp(s) for s in def_sets])
+    print(f"phi: {blocks} blocks, {variables} variables, fixpoint {old_time:.2f}s, worklist {new_time:.3f}s")
+
+
+def long_expression_program(terms, seed=0):
+    rnd = random.Random(seed)
+    names = ["a", "b", "c", "d"]
+    expr = [rnd.choice(names)]
+    for _ in range(terms - 1):
+        expr += (rnd.choice("+-"), rnd.choice(names + [str(rnd.randint(1, 99))]))
+    return "main {\n    a = 1\n    b = 2\n    c = 3\n    d = 4\n    x = " + " ".join(expr) + "\n    return x\n}"
+
+
+def bench_expressions():
+    # Длинные выражения: прежний разбор рекурсивен по числу операторов
+    for terms in (500, 5000, 100000):
+        text = long_expression_program(terms)
+        tokens = list(Lexer(text + "$").tokenize())
+        new_time, tree = measure(lambda: Parser(iter(tokens)).parse_function())
+        line = f"expressions: {terms} terms, precedence climbing {new_time * 1000:.1f} ms"
+        try:
+            old_time, _ = measure(lambda: RecursiveParser(iter(tokens)).parse_function())
+            line += f", recursive {old_time * 1000:.1f} ms"
+        except RecursionError:
+            line += ", recursive: RecursionError"
+        compile_time, graph = measure(lambda: compile_source(text))
+        print(line + f", full compile {compile_time * 1000:.1f} ms")
+
+
+def bench_sccp(statements):
+    graph = compile_source(random_program(0, statements))
+    before = sum(len(v.block) for v in graph.vertexes), len(graph.vertexes)
+    elapsed, folded = measure(lambda: propagate_constants(graph))
+    after = sum(len(v.block) for v in graph.vertexes), len(graph.vertexes)
+    print(f"sccp: {statements} statements, {elapsed:.2f}s, {folded} folded, "
+          f"{before[0]} -> {after[0]} instructions, {before[1]} -> {after[1]} blocks")
+
+
+def instruction_count(graph):
+    return sum(len(v.block) for v in graph.vertexes)
+
+
+def bench_dce(statements):
+    with open("input.txt") as file:
+        graph = compile_source(file)
+    before = instruction_count(graph)
+    removed = eliminate_dead_code(graph)
+    print(f"dce: input.txt, {removed} removed, {before} -> {instruction_count(graph)} instructions")
+    for passes in (["dce"], ["sccp", "dce"]):
+        graph = compile_source(random_program(0, statements))
+        before = instruction_count(graph)
+        elapsed, stats = measure(lambda: optimize(graph, passes))
+        print(f"dce: {statements} statements, {'+'.join(passes)} {elapsed:.2f}s, "
+              f"{before} -> {instruction_count(graph)} instructions")
+
+
+def redundant_program(statements, seed=0):
+    # Одни и те же суммы пересчитываются в разных блоках, а операнды меняются редко
+    rnd = random.Random(seed)
+    names = ["a", "b", "c", "d"]
+    lines = ["main {"] + ["    " + name + " = " + str(i + 1) for i, name in enumerate(names)]
+    for i in range(statements):
+        expr = rnd.choice(names) + " + " + rnd.choice(names)
+        if i % 50 == 49:
+            lines.append("    " + rnd.choice(names) + " = " + expr)
+        elif i % 3 == 2:
+            lines.append("    if (" + expr + ") { s = " + expr + " }")
+        else:
+            lines.append("    s = " + expr)
+    lines.append("    return s")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def bench_gvn(statements):
+    for name, text in (("redundant", redundant_program(statements)), ("random", random_program(0, statements))):
+        graph = compile_source(text)
+        before = instruction_count(graph)
+        elapsed, removed = measure(lambda: number_values(graph))
+        print(f"gvn: {name} program, {statements} statements, {elapsed:.2f}s, {removed} of {before} "
+              f"instructions removed")
+
+
+def phi_operand_count(graph):
+    return sum(len(stmt.arguments) for v in graph.vertexes for stmt in v.block if stmt.type == IR.PHI)
+
+
+def bench_copyprop(statements):
+    graph = compile_source(random_program(0, statements))
+    before = instruction_count(graph), phi_operand_count(graph)
+    elapsed, removed = measure(lambda: propagate_copies(graph))
+    print(f"copyprop: {statements} statements, {elapsed:.2f}s, {removed} removed, "
+          f"{before[0]} -> {instruction_count(graph)} instructions, "
+          f"{before[1]} -> {phi_operand_count(graph)} phi operands")
+
+
+def bench_vm(iterations):
+    graph = compile_source(loop_program(iterations), passes=list(PASSES))
+    elapsed, program = measure(lambda: Program.from_graph(graph))
+    print(f"vm: lowering {elapsed * 1000:.2f}ms, {len(program.code)} instructions, "
+          f"{len(program.registers)} registers")
+    elapsed, result = measure(program.run)
+    # Число выполненных команд: одна итерация внешнего цикла выполняет одинаковое их число
+    small = Program.from_graph(compile_source(loop_program(100), passes=list(PASSES)))
+    steps = count_steps(small) * iterations // 100
+    print(f"vm: {iterations} iterations, {elapsed:.2f}s, ~{steps / elapsed / 1e6:.1f}M instructions/s")
+    reference = compile_source(loop_program(iterations // 100), passes=list(PASSES))
+    reference_time, _ = measure(lambda: run_graph(reference))
+    print(f"vm: run_graph on {iterations // 100} iterations {reference_time:.2f}s, "
+          f"~{reference_time * 100 / elapsed:.0f}x slower than vm")
+
+
+def bench_native(iterations, calls=5):
+    graph = compile_source(loop_program(iterations), passes=list(PASSES))
+    elapsed, function = measure(lambda: compile_graph(graph))
+    print(f"native: source generation and compile() {elapsed * 1000:.2f}ms, cached afterwards")
+    native_time, _ = measure(lambda: [function() for _ in range(calls)])
+    vm_time, _ = measure(Program.from_graph(graph).run)
+    native_time /= calls
+    print(f"native: {iterations} iterations, {native_time:.2f}s per call ({calls} calls), "
+          f"vm {vm_time:.2f}s, {vm_time / native_time:.1f}x faster")
+    graph = compile_source(random_program(0, 20000))
+    elapsed, _ = measure(lambda: compile_graph(graph))
+    print(f"native: compiling a 20000-statement random program {elapsed:.2f}s")
+
+
+def count_steps(program):
+    # Число команд, выполненных программой
+    steps = 0
+    code = program.code
+    r = program.registers[:]
+    pc = 0
+    while True:
+        op, a, b, c = code[pc]
+        steps += 1
+        pc += 1
+        if op == ADD:
+            r[a] = r[b] + r[c]
+        elif op == SUB:
+            r[a] = r[b] - r[c]
+        elif op == MOV:
+            r[a] = r[b]
+        elif op == JMP:
+            pc = a
+        elif op == JNZ:
+            pc = b if r[a] != 0 else c
+        else:
+            return steps
+
+
+def rename_by_names(context):
+    # Прежнее переименование: отдельный обход дерева доминаторов для каждого имени.
+    # Имена сравниваются по первой букве, поэтому подходит только для переменных
+    # с разными первыми буквами; оставлено лишь для сравнения времени.
+    graph = context.graph
+    for name in context.names:
+        count = 0
+        stack = []
+        for current, entering in graph.dominator_tree_walk(graph.vertexes[1]):
+            if not entering:
+                for stmt in current.block:
+                    if stmt.value[0] == name[0]:
+                        stack.pop()
+                continue
+
+            for stmt in current.block:
+                if stmt.type != IR.PHI:
+                    for i, arg in enumerate(stmt.arguments):
+                        if arg[0] == name[0]:
+                            stmt.arguments[i] = version_name(name, stack[-1])
+                if stmt.value == name:
+                    stmt.value = version_name(stmt.value, count)
+                    stack.append(count)
+                    count += 1
+
+            for succ in current.output_vertexes:
+                j = context.which_pred(succ, current)
+                for stmt in succ.block:
+                    if stmt.type == IR.PHI and stmt.value[0] == name[0]:
+                        stmt.arguments[j] = version_name(name, stack[-1])
+
+
+def timed_renaming(text, legacy):
+    # Время только этапа переименования
+    context = Context()
+    rename = (lambda: rename_by_names(context)) if legacy else context.change_numeration
+    timing = []
+    context.change_numeration = lambda: timing.append(measure(rename)[0])
+    function = Parser(Lexer(text + "$").tokenize()).parse_function()
+    function.generate(Builder(context))
+    return timing[0]
+
+
+def bench_rename():
+    # Прежний алгоритм сравнивает только первую букву имени, поэтому для сравнения
+    # берутся переменные с разными первыми буквами.
+    text = program_over([chr(c) for c in range(ord("a"), ord("z") + 1)], 4000, random.Random(0))
+    old_time = timed_renaming(text, True)
+    new_time = timed_renaming(text, False)
+    print(f"rename: 26 variables, per-name walks {old_time:.2f}s, single walk {new_time:.3f}s")
+    for variables in (100, 400, 1600):
+        new_time = timed_renaming(many_variables_program(variables, 4000), False)
+        print(f"rename: {variables} variables, single walk {new_time:.3f}s")
+
+
+def retained_memory(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def bench_compact(statements):
+    graph = compile_source(many_variables_program(200, statements))
+    compact_size, compact = retained_memory(lambda: CompactGraph.from_graph(graph))
+    object_size, rebuilt = retained_memory(compact.to_graph)
+    instructions = compact.instruction_count()
+    print(f"compact: {len(compact)} blocks, {instructions} instructions, "
+          f"objects {object_size / instructions:.0f} B/instr, arrays {compact_size / instructions:.0f} B/instr")
+
+
+def bench_daemon(requests):
+    # Холодный запуск процесса на каждую компиляцию против запроса к прогретому серверу
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as file:
+        file.write(many_variables_program(10, 40))
+        path = file.name
+    try:
+        cold = []
+        for _ in range(requests):
+            elapsed, _ = measure(lambda: subprocess.run([sys.executable, "main.py", path],
+                                                        stdout=subprocess.DEVNULL, check=True))
+            cold.append(elapsed)
+        with open(path) as f:
+            request = json.dumps({"source": f.read()}) + "\n"
+        for jobs in ("0", "1"):
+            server = subprocess.Popen([sys.executable, "server.py", "-j", jobs], stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE, text=True)
+            warm = []
+            for _ in range(requests):
+                def round_trip():
+                    server.stdin.write(request)
+                    server.stdin.flush()
+                    server.stdout.readline()
+                warm.append(measure(round_trip)[0])
+            server.stdin.close()
+            server.wait()
+            print(f"daemon: -j {jobs}, median round-trip {sorted(warm)[len(warm) // 2] * 1000:.2f} ms")
+        print(f"daemon: cold process, median {sorted(cold)[len(cold) // 2] * 1000:.2f} ms")
+    finally:
+        os.remove(path)
+
+
+def bench_binary(statements):
+    # Открытие большого дампа: отображение файла против разбора JSON
+    graph = compile_source(many_variables_program(200, statements))
+    with tempfile.TemporaryDirectory() as directory:
+        bin_path = os.path.join(directory, "graph.bin")
+        json_path = os.path.join(directory, "graph.json")
+        write_time, _ = measure(lambda: binary.dump(graph, bin_path))
+        with open(json_path, "w") as file:
+            json.dump(graph.to_dict(), file)
+        open_time, mapped = measure(lambda: binary.load(bin_path))
+        block_time, _ = measure(lambda: mapped.block(len(mapped) // 2))
+        mapped.close()
+
+        def load_json():
+            with open(json_path) as f:
+                return Graph.from_dict(json.load(f))
+        json_time, _ = measure(load_json)
+        print(f"binary: {len(graph.vertexes)} blocks, {os.path.getsize(bin_path) / 2 ** 20:.1f} MB "
+              f"(JSON {os.path.getsize(json_path) / 2 ** 20:.1f} MB), write {write_time:.2f}s, "
+              f"open {open_time * 1000:.2f} ms, one block {block_time * 1000:.3f} ms, JSON load {json_time:.2f}s")
+
+
+def print_per_line(graph):
+    # Прежний вывод: отдельный print на каждую строку
+    print("digraph g{")
+    print("\tnode [shape = box]")
+    for v in graph.vertexes:
+        print("\t" + str(v.number) + "[label=\"")
+        for elem in v.block:
+            print("\t\t" + str(elem))
+        print("\t\"]")
+        for elem in v.output_vertexes:
+            print("\t" + str(v.number) + "->" + str(elem.number))
+    print("}")
+
+
+def bench_emit(statements):
+    graph = compile_source(many_variables_program(200, statements))
+    with tempfile.TemporaryDirectory() as directory:
+        old_path = os.path.join(directory, "old.dot")
+        new_path = os.path.join(directory, "new.dot")
+
+        def legacy():
+            with open(old_path, "w") as out, redirect_stdout(out):
+                print_per_line(graph)
+        old_time, _ = measure(legacy)
+        new_time, _ = measure(lambda: dump_dot(graph, new_path))
+        gzip_time, _ = measure(lambda: dump_dot(graph, new_path + ".gz"))
+        print(f"emit: {os.path.getsize(new_path) / 2 ** 20:.1f} MB DOT, print per line {old_time:.2f}s, "
+              f"buffered {new_time:.2f}s, gzip {gzip_time:.2f}s")
+
+
+def bench_incremental(statements):
+    # Правки в большой функции: полная компиляция против повторной.
+    # Первая правка меняет выражение в условии, вторая вставляет новое условие
+    # (блоки следующих операторов сдвигаются) и переопределяет переменную.
+    lines = many_variables_program(50, statements).split("\n")
+    middle = len(lines) // 2
+    while "if" not in lines[middle]:
+        middle += 1
+    target = lines[middle].split()[3]
+    edits = [list(lines)]
+    edits[0][middle] = lines[middle].replace(" }", " + 1 }")
+    edits.append(edits[0][:middle] + ["    if (" + target + ") { " + target + " = 1 }"] + edits[0][middle:])
+    compiler = IncrementalCompiler()
+    first_time, _ = measure(lambda: compiler.compile("\n".join(lines)))
+    print(f"incremental: {statements} statements, first compile {first_time:.2f}s")
+    for edited in edits:
+        text = "\n".join(edited)
+        full_time, _ = measure(lambda: compile_source(text))
+        incremental_time, _ = measure(lambda: compiler.compile(text))
+        print(f"  full {full_time:.2f}s, after the edit {incremental_time * 1000:.1f}ms "
+              f"({compiler.rebuilt} rebuilt, {compiler.reused} reused)")
+
+
+BENCHMARKS = {
+    "lexer": lambda: bench_lexer(120000),
+    "stream": lambda: bench_stream(120000),
+    "dominators": bench_dominators,
+    "dynamic": bench_dynamic_dominators,
+    "deep": bench_deep,
+    "phi": lambda: bench_phi(3000, 100),
+    "rename": bench_rename,
+    "expressions": bench_expressions,
+    "sccp": lambda: bench_sccp(20000),
+    "dce": lambda: bench_dce(20000),
+    "gvn": lambda: bench_gvn(20000),
+    "copyprop": lambda: bench_copyprop(20000),
+    "vm": lambda: bench_vm(1000000),
+    "native": lambda: bench_native(1000000),
+    "compact": lambda: bench_compact(200000),
+    "daemon": lambda: bench_daemon(20),
+    "binary": lambda: bench_binary(200000),
+    "emit": lambda: bench_emit(200000),
+    "incremental": lambda: bench_incremental(20000),
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
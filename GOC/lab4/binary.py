@@ -0,0 +1,150 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from compact import CompactGraph
+
+# Двоичный формат графа в SSA-форме (little-endian).
+# Заголовок: сигнатура и размеры разделов, затем разделы в фиксированном порядке:
+#   int32: numbers, block_start, idom, succ_start, succ, pred_start, pred,
+#          op_value, op_bin, arg_start, arg_ids, string_start
+#   int8:  op_type
+#   bytes: строки в UTF-8 подряд, границы задает string_start
+# Все массивы int32 идут первыми, поэтому выравнивание сохраняется без заполнителей.
+MAGIC = b"GOKSSA1\0"
+HEADER = struct.Struct("<8s7I")
+
+
+def section_lengths(blocks, instructions, arguments, successors, predecessors, strings):
+    return [
+        ("numbers", blocks),
+        ("block_start", blocks + 1),
+        ("idom", blocks),
+        ("succ_start", blocks + 1),
+        ("succ", successors),
+        ("pred_start", blocks + 1),
+        ("pred", predecessors),
+        ("op_value", instructions),
+        ("op_bin", instructions),
+        ("arg_start", instructions + 1),
+        ("arg_ids", arguments),
+        ("string_start", strings + 1),
+    ]
+
+
+def little_endian(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def dump(graph, path):
+    # Запись графа (Graph или CompactGraph) в файл
+    compact = graph if isinstance(graph, CompactGraph) else CompactGraph.from_graph(graph)
+    encoded = [s.encode() for s in compact.strings]
+    string_start = array("i", [0])
+    for s in encoded:
+        string_start.append(string_start[-1] + len(s))
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, len(compact), compact.instruction_count(), len(compact.arg_ids),
+                               len(compact.succ), len(compact.pred), len(encoded), string_start[-1]))
+        for name, _ in section_lengths(0, 0, 0, 0, 0, 0):
+            values = string_start if name == "string_start" else getattr(compact, name)
+            file.write(little_endian(values))
+        file.write(compact.op_type.tobytes())
+        file.write(b"".join(encoded))
+
+
+class StringTable:
+    # Строки декодируются из отображенного файла при первом обращении
+    __slots__ = ("start", "blob", "cache")
+
+    def __init__(self, start, blob):
+        self.start = start
+        self.blob = blob
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.start) - 1
+
+    def __getitem__(self, i):
+        s = self.cache.get(i)
+        if s is None:
+            s = self.cache[i] = str(self.blob[self.start[i]:self.start[i + 1]], "utf-8")
+        return s
+
+
+# Граф, отображенный в память: массивы CompactGraph являются представлениями файла,
+# поэтому открытие не зависит от размера, а блоки декодируются при обращении.
+class MappedGraph(CompactGraph):
+    __slots__ = ("file", "map", "views")
+
+    def close(self):
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load(path):
+    file = open(path, "rb")
+    try:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except BaseException:
+        file.close()
+        raise
+    views = []
+    try:
+        if len(mapped) < HEADER.size:
+            raise ValueError(f"{path}: not a graph file")
+        magic, blocks, instructions, arguments, successors, predecessors, strings, blob_size = \
+            HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a graph file")
+        sections = section_lengths(blocks, instructions, arguments, successors, predecessors, strings)
+        # Обрезанный или дописанный файл не открывается: иначе часть данных терялась бы молча
+        size = HEADER.size + 4 * sum(length for _, length in sections) + instructions + blob_size
+        if size != len(mapped):
+            raise ValueError(f"{path}: size {len(mapped)} does not match the header, expected {size}")
+        graph = MappedGraph.__new__(MappedGraph)
+        whole = memoryview(mapped)
+        views.append(whole)
+        offset = HEADER.size
+        for name, length in sections:
+            raw = whole[offset:offset + 4 * length]
+            if sys.byteorder == "big":
+                values = array("i", raw)
+                values.byteswap()
+            else:
+                values = raw.cast("i")
+                views.extend((raw, values))
+            offset += 4 * length
+            if name == "string_start":
+                string_start = values
+            else:
+                setattr(graph, name, values)
+        graph.op_type = whole[offset:offset + instructions].cast("b")
+        views.append(graph.op_type)
+        offset += instructions
+        blob = whole[offset:offset + blob_size]
+        views.append(blob)
+        graph.strings = StringTable(string_start, blob)
+    except BaseException:
+        for view in reversed(views):
+            view.release()
+        mapped.close()
+        file.close()
+        raise
+    graph.file = file
+    graph.map = mapped
+    graph.views = views
+    return graph
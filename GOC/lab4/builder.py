@@ -38,7 +38,8 @@ class Builder:
         self.context.cur_vertex.insert_tail(expr)
 
     def add_connector(self, from_v, to_v):
-        # Добавляем связь между вершинами from_v и to_v
+        # Добавляем связь между вершинами from_v и to_v.
+        # to_v запоминает номер ребра от from_v для аргументов ф-функций.
         from_v.add_output_connector(to_v)
         to_v.add_input_connector(from_v)
 
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from graph import Graph
+
+
+# Кэш скомпилированных графов на диске, адресуемый по содержимому.
+# Ключ - хэш версии компилятора и текста программы, значение - граф в SSA-форме в JSON.
+# Запись идет во временный файл с последующим os.replace, поэтому несколько процессов
+# могут пользоваться одним каталогом. Время изменения файла отмечает последнее
+# обращение; при превышении размера удаляются самые давно использованные записи.
+# Размер кэша хранится как счетчик: каталог просматривается при первой записи и при
+# вытеснении, а вытеснение освобождает место с запасом до LOW_WATER от лимита.
+# Записи других процессов счетчик не видит; он уточняется при каждом просмотре каталога.
+LOW_WATER = 0.9
+
+
+class CompileCache:
+    def __init__(self, directory, max_bytes=64 * 2 ** 20, version=""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = version
+        # Суммарный размер записей; None - каталог еще не просматривался
+        self.total = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, text, options=""):
+        # options - настройки компиляции, меняющие результат (например, проходы оптимизации)
+        digest = hashlib.sha256()
+        digest.update(self.version.encode())
+        digest.update(b"\0")
+        digest.update(options.encode())
+        digest.update(b"\0")
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, text, options=""):
+        # Граф из кэша или None; испорченная или удаленная запись считается промахом
+        path = self.path(self.key(text, options))
+        try:
+            with open(path) as file:
+                data = json.load(file)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            self.remove(path)
+            return None
+        return Graph.from_dict(data)
+
+    def put(self, text, graph, options=""):
+        path = self.path(self.key(text, options))
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(graph.to_dict(), file, separators=(",", ":"))
+            size = os.path.getsize(tmp_path)
+            try:
+                # Запись с тем же ключом заменяется, ее размер больше не учитывается
+                size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+        except BaseException:
+            self.remove(tmp_path)
+            raise
+        if self.total is None:
+            self.total = self.scan()[0]
+        else:
+            self.total += size
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def scan(self):
+        # Суммарный размер и список (время обращения, размер, путь) всех записей
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return total, entries
+
+    def evict(self):
+        # Удаление самых старых по времени обращения записей, пока размер не опустится
+        # до LOW_WATER от лимита: следующий просмотр понадобится не раньше, чем кэш вырастет снова
+        total, entries = self.scan()
+        if total > self.max_bytes:
+            limit = self.max_bytes * LOW_WATER
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= limit:
+                    break
+                self.remove(path)
+                total -= size
+        self.total = total
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,124 @@
+import sys
+from array import array
+
+import IR
+from graph import Graph
+
+# Коды типов операторов IR в компактном представлении
+TYPES = [IR.NULL, IR.PHI, IR.ASSIGN, IR.RETURN, IR.CMP]
+TYPE_CODES = {t: i for i, t in enumerate(TYPES)}
+
+
+# Граф, хранящийся в массивах: таблица строк, массивы операторов и аргументов,
+# CSR-массивы преемников и предшественников и массив непосредственных доминаторов.
+# Вершины задаются индексами, операнды - номерами строк в таблице.
+class CompactGraph:
+    __slots__ = ("strings", "numbers", "block_start", "op_type", "op_value", "op_bin",
+                 "arg_start", "arg_ids", "succ_start", "succ", "pred_start", "pred", "idom")
+
+    def __init__(self):
+        self.strings = []
+        self.numbers = array("i")
+        self.block_start = array("i", [0])
+        self.op_type = array("b")
+        self.op_value = array("i")
+        self.op_bin = array("i")
+        self.arg_start = array("i", [0])
+        self.arg_ids = array("i")
+        self.succ_start = array("i", [0])
+        self.succ = array("i")
+        self.pred_start = array("i", [0])
+        self.pred = array("i")
+        self.idom = array("i")
+
+    @staticmethod
+    def from_graph(graph):
+        result = CompactGraph()
+        ids = {}
+
+        def string_id(s):
+            if s is None:
+                return -1
+            s = str(s)
+            i = ids.get(s)
+            if i is None:
+                i = ids[s] = len(result.strings)
+                result.strings.append(s)
+            return i
+
+        for v in graph.vertexes:
+            result.numbers.append(-1 if v.number is None else v.number)
+            for stmt in v.block:
+                result.op_type.append(TYPE_CODES[stmt.type])
+                result.op_value.append(string_id(stmt.value))
+                result.op_bin.append(string_id(stmt.bin_op))
+                for arg in stmt.arguments:
+                    result.arg_ids.append(string_id(arg))
+                result.arg_start.append(len(result.arg_ids))
+            result.block_start.append(len(result.op_type))
+            result.succ.extend(succ.index for succ in v.output_vertexes)
+            result.succ_start.append(len(result.succ))
+            result.pred.extend(pred.index for pred in v.input_vertexes)
+            result.pred_start.append(len(result.pred))
+            result.idom.append(-1 if v.idom is None else v.idom.index)
+        return result
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def instruction_count(self):
+        return len(self.op_type)
+
+    def successors(self, i):
+        return self.succ[self.succ_start[i]:self.succ_start[i + 1]]
+
+    def predecessors(self, i):
+        return self.pred[self.pred_start[i]:self.pred_start[i + 1]]
+
+    def instruction(self, k):
+        # Восстановление одного оператора IR по его номеру
+        strings = self.strings
+        stmt = IR.IR(TYPES[self.op_type[k]], strings[self.op_value[k]])
+        for a in range(self.arg_start[k], self.arg_start[k + 1]):
+            stmt.add_argument(strings[self.arg_ids[a]])
+        if self.op_bin[k] >= 0:
+            stmt.add_bin_op(strings[self.op_bin[k]])
+        return stmt
+
+    def block(self, i):
+        return [self.instruction(k) for k in range(self.block_start[i], self.block_start[i + 1])]
+
+    def to_graph(self):
+        # Обратное преобразование в объектный граф
+        graph = Graph()
+        vertexes = [graph.add_vertex() for _ in range(len(self))]
+        for i, v in enumerate(vertexes):
+            v.number = self.numbers[i]
+            for stmt in self.block(i):
+                v.insert_tail(stmt)
+            for j in self.successors(i):
+                v.add_output_connector(vertexes[j])
+            for j in self.predecessors(i):
+                v.add_input_connector(vertexes[j])
+            if self.idom[i] >= 0:
+                v.idom = vertexes[self.idom[i]]
+        for v in vertexes:
+            if v.idom is not None:
+                v.idom.add_child(v)
+        return graph
+
+    def print_graph(self):
+        self.write_graph(sys.stdout)
+
+    def write_graph(self, out):
+        out.write("digraph g{\n\tnode [shape = box]\n")
+        for i in range(len(self)):
+            number = str(self.numbers[i])
+            lines = ["\t", number, "[label=\"\n"]
+            for stmt in self.block(i):
+                lines += ("\t\t", str(stmt), "\n")
+            lines.append("\t\"]\n")
+            for j in self.successors(i):
+                lines += ("\t", number, "->", str(self.numbers[j]), "\n")
+            out.write("".join(lines))
+        out.write("}\n")
@@ -0,0 +1,71 @@
+import hashlib
+import itertools
+import os
+
+from builder import Builder
+from cache import CompileCache
+from context import Context
+from lexer import Lexer
+from optimize import optimize
+from parser import Parser
+
+# Версия компилятора для ключей кэша: хэш исходников всех этапов компиляции,
+# поэтому любое изменение компилятора делает старые записи недействительными.
+PIPELINE_MODULES = ["IR.py", "builder.py", "cache.py", "compiler.py", "context.py", "copyprop.py", "dce.py",
+                    "defuse.py", "graph.py", "gvn.py", "lexer.py", "nodes.py", "optimize.py", "parser.py",
+                    "sccp.py"]
+
+
+def compiler_version():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in PIPELINE_MODULES:
+        with open(os.path.join(directory, name), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+COMPILER_VERSION = compiler_version()
+
+
+def compile_source(text, cache=None, passes=(), stats=None, messages=None):
+    # Компилирует текст программы (строку или итератор строк) в граф в SSA-форме
+    # и применяет к нему проходы оптимизации passes (имена из optimize.PASSES).
+    # В словарь stats записываются счетчики проходов (при попадании в кэш - ничего).
+    # Сообщения лексера об ошибках пишутся в поток messages (по умолчанию sys.stdout).
+    # Каждый вызов работает в собственном контексте, поэтому функцию можно
+    # вызывать многократно и из разных потоков.
+    # С кэшем (CompileCache) текст читается целиком, чтобы вычислить ключ.
+    if cache is not None:
+        if not isinstance(text, str):
+            text = "".join(text)
+        options = ",".join(passes)
+        graph = cache.get(text, options)
+        if graph is None:
+            graph = compile_source(text, passes=passes, stats=stats, messages=messages)
+            cache.put(text, graph, options)
+        return graph
+    if isinstance(text, str):
+        source = text + "$"
+    else:
+        source = itertools.chain(text, ["$"])
+    tokens = Lexer(source, lazy=True, messages=messages).tokenize()
+    function = Parser(tokens).parse_function()
+    graph = function.generate(Builder(Context()))
+    if passes:
+        optimize(graph, passes, stats)
+    return graph
+
+
+# Открытые кэши процесса: счетчик размера каталога живет между запросами
+CACHES = {}
+
+
+def open_cache(directory, max_bytes=64 * 2 ** 20):
+    # Кэш в каталоге directory для текущей версии компилятора или None
+    if directory is None:
+        return None
+    cache = CACHES.get((directory, max_bytes))
+    if cache is None:
+        cache = CACHES.setdefault((directory, max_bytes), CompileCache(directory, max_bytes, COMPILER_VERSION))
+    return cache
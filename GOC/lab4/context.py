@@ -1,63 +1,95 @@
+import sys
+
 from graph import *
 
+
+# Имя версии переменной в SSA. Символ "_" не встречается в именах программы, поэтому
+# версии разных переменных не совпадают (a1 версии 0 - a1_0, a версии 10 - a_10).
+def version_name(name, version):
+    return sys.intern(name + "_" + str(version))
+
+
+# Имя переменной по имени ее версии.
+def base_name(version):
+    return version[:version.rindex("_")]
+
+
 # Класс Context представляет контекст выполнения и хранит информацию о текущем состоянии процесса или алгоритма.
 class Context:
     def __init__(self):
-        self.count = 0
-        self.stack = []
         self.n = 0
         self.names = set()
+        self.temporaries = set()
+        # Число версий каждого имени после переименования
+        self.counters = {}
         self.graph = Graph()
         self.cur_vertex = None
 
-    # Метод определяет предшествующую вершину v1 в отношении вершины v.
+    # Метод создает временную переменную для трехадресного кода.
+    # Символ "_" не встречается в именах программы, поэтому имя не совпадет с пользовательским.
+    def new_temporary(self):
+        name = sys.intern("_t" + str(len(self.temporaries)))
+        self.temporaries.add(name)
+        self.names.add(name)
+        return name
+
+    # Метод определяет номер вершины v среди предшественников вершины v1.
     def which_pred(self, v1, v):
-        for i, ver in enumerate(v1.input_vertexes):
-            if ver.dfs_number == v.dfs_number:
-                return i
-        print("lose")
+        slot = v1.pred_slots.get(v)
+        if slot is None:
+            raise ValueError(f"vertex {v.number} is not a predecessor of vertex {v1.number}")
+        return slot
 
-    # Метод изменяет нумерацию в графе для всех имен.
+    # Метод изменяет нумерацию в графе для всех имен за один обход дерева доминаторов.
+    # Для каждого имени хранится свой счетчик и стек номеров версий.
     def change_numeration(self):
-        for name in self.names:
-            self.count = 0
-            self.stack.clear()
-            self.change_numeration_by_name(name)
-
-    # Метод изменяет нумерацию в графе для конкретного имени.
-    def change_numeration_by_name(self, name):
-        self.traverse(self.graph.vertexes[1], name)
-
-    # Метод выполняет обход графа, изменяя нумерацию для конкретного имени.
-    # переименование перемнной
-    def traverse(self, v, name):
-        for stmt in v.block:
-            if stmt.type != IR.PHI:
-                for i, arg in enumerate(stmt.arguments):
-                    if arg[0] == name[0]:
-                        stmt.arguments[i] = name + str(self.stack[-1])
-            if stmt.value == name:
-                stmt.value = stmt.value + str(self.count)
-                self.stack.append(self.count)
-                self.count += 1
+        counters = dict.fromkeys(self.names, 0)
+        stacks = {name: [] for name in self.names}
+        pushed = {}
+        for v, entering in self.graph.dominator_tree_walk(self.graph.vertexes[1]):
+            if not entering:
+                for name in pushed.pop(v):
+                    stacks[name].pop()
+                continue
 
-        for succ in v.output_vertexes:
-            j = self.which_pred(succ, v)
-            for stmt in succ.block:
-                if stmt.type == IR.PHI and stmt.value[0] == name[0]:
-                    stmt.arguments[j] = name + str(self.stack[-1])
+            defined = []
+            for stmt in v.block:
+                if stmt.type != IR.PHI:
+                    arguments = stmt.arguments
+                    for i, arg in enumerate(arguments):
+                        stack = stacks.get(arg)
+                        if stack:
+                            arguments[i] = version_name(arg, stack[-1])
+                name = stmt.value
+                if name in counters:
+                    version = counters[name]
+                    counters[name] = version + 1
+                    stmt.value = version_name(name, version)
+                    stacks[name].append(version)
+                    defined.append(name)
+            pushed[v] = defined
 
-        for child in v.children:
-            self.traverse(child, name)
-        for stmt in v.block:
-            l = stmt.value
-            if l[0] == name[0]:
-                self.stack.pop()
+            # Аргумент ф-функции на ребре еще не переименован и совпадает с именем переменной
+            for succ in v.output_vertexes:
+                j = self.which_pred(succ, v)
+                for stmt in succ.block:
+                    if stmt.type != IR.PHI:
+                        break
+                    name = stmt.arguments[j]
+                    stack = stacks.get(name)
+                    if stack:
+                        stmt.arguments[j] = version_name(name, stack[-1])
+        self.counters = counters
+        # После переименования индекс строится заново по версиям переменных
+        self.graph.def_use.rebuild(self.graph.vertexes)
 
     # Метод размещает операторы PHI в графе.
     def place_phi(self):
         for name in self.names:
-            using_set = self.graph.get_all_assign(name)
+            # Временная переменная определяется один раз в том же блоке, где используется
+            if name in self.temporaries:
+                continue
+            using_set = self.graph.def_use.def_blocks(name)
             places = self.graph.make_dfp(using_set)
             for place in places:
                 phi_expr = IR.IR(IR.PHI, name)
@@ -0,0 +1,49 @@
+import IR
+from dce import resolve
+
+
+def is_copy(stmt):
+    return stmt.type == IR.ASSIGN and stmt.bin_op is None and IR.is_variable(stmt.arguments[0])
+
+
+def propagate_copies(graph):
+    # Распространение копий: использования результата x = y заменяются на y, копия удаляется.
+    # После замены ф-функции с одним и тем же значением на всех входах становятся
+    # копиями, а ф-функции одного блока с одинаковыми аргументами сливаются в одну.
+    # Возвращает число удаленных операторов.
+    graph.revision += 1
+    replaced = {}
+    phis = []
+    for v in graph.vertexes:
+        for stmt in v.block:
+            if is_copy(stmt):
+                replaced[stmt.value] = stmt.arguments[0]
+            elif stmt.type == IR.PHI:
+                phis.append((v, stmt))
+    changed = True
+    while changed:
+        changed = False
+        same = {}
+        for v, stmt in phis:
+            if stmt.value in replaced:
+                continue
+            arguments = tuple(resolve(arg, replaced) for arg in stmt.arguments)
+            operands = set(arguments)
+            operands.discard(stmt.value)
+            if len(operands) == 1:
+                replaced[stmt.value] = operands.pop()
+                changed = True
+                continue
+            leader = same.setdefault((v, arguments), stmt.value)
+            if leader != stmt.value:
+                replaced[stmt.value] = leader
+                changed = True
+    if not replaced:
+        return 0
+    for v in graph.vertexes:
+        v.block = [stmt for stmt in v.block
+                   if (stmt.type != IR.ASSIGN and stmt.type != IR.PHI) or stmt.value not in replaced]
+        for stmt in v.block:
+            stmt.arguments = [resolve(arg, replaced) for arg in stmt.arguments]
+    graph.def_use.rebuild(graph.vertexes)
+    return len(replaced)
@@ -0,0 +1,77 @@
+import IR
+
+
+def resolve(name, replaced):
+    # Конечная замена имени с сокращением цепочек замен
+    target = replaced.get(name)
+    if target is None:
+        return name
+    chain = []
+    while target in replaced:
+        chain.append(name)
+        name = target
+        target = replaced[name]
+    for n in chain:
+        replaced[n] = target
+    return target
+
+
+def remove_trivial_phis(graph):
+    # Ф-функция, все аргументы которой - одно и то же значение или она сама, заменяется
+    # этим значением. Удаление одной ф-функции может сделать тривиальными другие,
+    # поэтому проход повторяется, пока есть изменения. Возвращает число удаленных ф-функций.
+    phis = [stmt for v in graph.vertexes for stmt in v.block if stmt.type == IR.PHI]
+    replaced = {}
+    changed = True
+    while changed:
+        changed = False
+        for stmt in phis:
+            if stmt.value in replaced:
+                continue
+            operands = {resolve(arg, replaced) for arg in stmt.arguments}
+            operands.discard(stmt.value)
+            if len(operands) == 1:
+                replaced[stmt.value] = operands.pop()
+                changed = True
+    if not replaced:
+        return 0
+    for v in graph.vertexes:
+        v.block = [stmt for stmt in v.block if stmt.type != IR.PHI or stmt.value not in replaced]
+        for stmt in v.block:
+            stmt.arguments = [resolve(arg, replaced) for arg in stmt.arguments]
+    graph.def_use.rebuild(graph.vertexes)
+    return len(replaced)
+
+
+def sweep_dead_code(graph):
+    # Пометка от корней (return и условия переходов) по определениям операндов,
+    # затем удаление непомеченных присваиваний и ф-функций. Возвращает число удаленных.
+    live = set()
+    worklist = []
+    for v in graph.vertexes:
+        for stmt in v.block:
+            if stmt.type == IR.RETURN or stmt.type == IR.CMP:
+                live.add(stmt)
+                worklist.append(stmt)
+    while worklist:
+        stmt = worklist.pop()
+        for arg in stmt.arguments:
+            definition = graph.def_use.definition(arg)
+            if definition is not None and definition[1] not in live:
+                live.add(definition[1])
+                worklist.append(definition[1])
+    removed = 0
+    for v in graph.vertexes:
+        block = [stmt for stmt in v.block if stmt in live]
+        removed += len(v.block) - len(block)
+        v.block = block
+    if removed:
+        graph.def_use.rebuild(graph.vertexes)
+    return removed
+
+
+def eliminate_dead_code(graph):
+    # Проход DCE: удаление тривиальных ф-функций и недостижимого от корней кода.
+    # Возвращает число удаленных операторов.
+    graph.revision += 1
+    return remove_trivial_phis(graph) + sweep_dead_code(graph)
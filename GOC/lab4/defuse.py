@@ -0,0 +1,56 @@
+import IR
+
+
+# Индекс определений и использований переменных.
+# Для каждого имени (а после SSA - для каждой версии) хранит списки пар (вершина, оператор).
+class DefUse:
+    def __init__(self):
+        self.defs = {}
+        self.uses = {}
+
+    def add(self, vertex, stmt):
+        # Регистрирует оператор, добавленный в вершину vertex
+        if stmt.type == IR.ASSIGN or stmt.type == IR.PHI:
+            self.defs.setdefault(stmt.value, []).append((vertex, stmt))
+        for arg in stmt.arguments:
+            if IR.is_variable(arg):
+                self.uses.setdefault(arg, []).append((vertex, stmt))
+
+    def remove(self, vertex, stmt):
+        # Удаляет из индекса все записи оператора stmt
+        if stmt.type == IR.ASSIGN or stmt.type == IR.PHI:
+            self.discard(self.defs, stmt.value, stmt)
+        for arg in stmt.arguments:
+            if IR.is_variable(arg):
+                self.discard(self.uses, arg, stmt)
+
+    @staticmethod
+    def discard(table, name, stmt):
+        entries = table.get(name)
+        if entries is None:
+            return
+        entries[:] = [entry for entry in entries if entry[1] is not stmt]
+        if not entries:
+            del table[name]
+
+    def rebuild(self, vertexes):
+        # Полное построение индекса, например после переименования в SSA
+        self.defs.clear()
+        self.uses.clear()
+        for v in vertexes:
+            for stmt in v.block:
+                self.add(v, stmt)
+
+    def definitions(self, name):
+        return self.defs.get(name, [])
+
+    def definition(self, name):
+        # Единственное определение версии переменной в SSA или None
+        entries = self.defs.get(name)
+        return entries[0] if entries else None
+
+    def def_blocks(self, name):
+        return {v for v, stmt in self.defs.get(name, [])}
+
+    def uses_of(self, name):
+        return self.uses.get(name, [])
@@ -0,0 +1,30 @@
+import gzip
+import io
+
+# Размер буфера записи графа в файл
+BUFFER_SIZE = 1 << 16
+# Уровень сжатия gzip: 9 по умолчанию заметно медленнее при почти том же размере
+COMPRESS_LEVEL = 6
+
+
+def open_output(path, compress=None):
+    # Текстовый поток для записи графа: обычный файл с большим буфером или gzip.
+    # compress=None включает сжатие по расширению .gz.
+    if compress is None:
+        compress = path.endswith(".gz")
+    if compress:
+        raw = gzip.open(path, "wb", compresslevel=COMPRESS_LEVEL)
+        return io.TextIOWrapper(io.BufferedWriter(raw, BUFFER_SIZE), encoding="utf-8")
+    return open(path, "w", buffering=BUFFER_SIZE, encoding="utf-8")
+
+
+def dump_dot(graph, path, compress=None):
+    # Запись графа (Graph, CompactGraph или MappedGraph) в файл в формате Graphviz
+    with open_output(path, compress) as out:
+        graph.write_graph(out)
+
+
+def dot_string(graph):
+    out = io.StringIO()
+    graph.write_graph(out)
+    return out.getvalue()
@@ -1,7 +1,14 @@
+import heapq
+import sys
+
 import IR
+from defuse import DefUse
 
 
 class Vertex:
+    __slots__ = ("block", "input_vertexes", "output_vertexes", "children", "number",
+                 "checked", "dfs_number", "idom", "def_use", "index", "pred_slots")
+
     def __init__(self, block, input_vertexes, output_vertexes):
         self.block = block
         self.input_vertexes = input_vertexes
@@ -10,6 +17,14 @@ class Vertex:
         self.number = None
         self.checked = False
         self.dfs_number = None
+        self.idom = None
+        self.def_use = None
+        # Позиция вершины в Graph.vertexes
+        self.index = None
+        # Предшественник -> номер его ребра в input_vertexes (и аргумента ф-функций)
+        self.pred_slots = {}
+        for i, v in enumerate(input_vertexes):
+            self.pred_slots.setdefault(v, i)
 
     @staticmethod
     def init_empty_vertex():
@@ -20,46 +35,116 @@ class Vertex:
 
     def insert_head(self, expr):
         self.block.insert(0, expr)
+        if self.def_use is not None:
+            self.def_use.add(self, expr)
 
     def insert_tail(self, expr):
         self.block.append(expr)
+        if self.def_use is not None:
+            self.def_use.add(self, expr)
 
     def add_output_connector(self, to):
         self.output_vertexes.append(to)
 
     def add_input_connector(self, from_v):
+        self.pred_slots.setdefault(from_v, len(self.input_vertexes))
         self.input_vertexes.append(from_v)
 
+    def remove_output_connector(self, to):
+        self.output_vertexes.remove(to)
+
+    def remove_input_connector(self, from_v):
+        # Удаляет ребро от from_v и возвращает номер его места; места следующих ребер сдвигаются
+        slot = self.pred_slots[from_v]
+        del self.input_vertexes[slot]
+        self.pred_slots = {}
+        for i, v in enumerate(self.input_vertexes):
+            self.pred_slots.setdefault(v, i)
+        return slot
+
     def to_graph(self):
-        print("\t" + str(self.number) + "[label=\"")
+        self.write_graph(sys.stdout)
+
+    def write_graph(self, out):
+        # Вершина в формате Graphviz собирается в одну строку и пишется за один вызов
+        number = str(self.number)
+        lines = ["\t", number, "[label=\"\n"]
         for elem in self.block:
-            print("\t\t" + str(elem))
-        print("\t\"]")
+            lines += ("\t\t", str(elem), "\n")
+        lines.append("\t\"]\n")
         for elem in self.output_vertexes:
-            print("\t" + str(self.number) + "->" + str(elem.number))
+            lines += ("\t", number, "->", str(elem.number), "\n")
+        out.write("".join(lines))
 
 
 class Graph:
     def __init__(self):
         self.vertexes = []
         self.DF = {}
+        self.def_use = DefUse()
+        # Номер версии графа: увеличивается при каждом изменении на месте (проходы,
+        # правки ребер, повторная компиляция), по нему сбрасываются кэши по графу
+        self.revision = 0
 
     def add_vertex(self):
         vertex = Vertex.init_empty_vertex()
+        vertex.def_use = self.def_use
+        vertex.index = len(self.vertexes)
         self.vertexes.append(vertex)
         return vertex
 
+    def to_dict(self):
+        # Описание графа из простых типов (для JSON): блоки, ребра по индексам и idom
+        blocks = []
+        for v in self.vertexes:
+            blocks.append({
+                "number": v.number,
+                "statements": [stmt.to_dict() for stmt in v.block],
+                "successors": [succ.index for succ in v.output_vertexes],
+                "predecessors": [pred.index for pred in v.input_vertexes],
+                "idom": None if v.idom is None else v.idom.index,
+            })
+        return {"blocks": blocks}
+
+    @staticmethod
+    def from_dict(data):
+        # Восстановление графа из описания to_dict
+        graph = Graph()
+        blocks = data["blocks"]
+        vertexes = [graph.add_vertex() for _ in blocks]
+        for v, block in zip(vertexes, blocks):
+            v.number = block["number"]
+            for stmt in block["statements"]:
+                v.insert_tail(IR.IR.from_dict(stmt))
+            for i in block["successors"]:
+                v.add_output_connector(vertexes[i])
+            for i in block["predecessors"]:
+                v.add_input_connector(vertexes[i])
+            if block["idom"] is not None:
+                v.idom = vertexes[block["idom"]]
+        for v in vertexes:
+            if v.idom is not None:
+                v.idom.add_child(v)
+        return graph
+
     def make_DF(self):
+        # DF хранится по индексам вершин: индекс -> множество индексов
         post_order = self.generate_post_order()
+        self.DF = {}
         for elem in post_order:
-            self.DF[elem] = set()
-            for succ in elem.output_vertexes:
-                if succ.idom != elem:
-                    self.DF[elem].add(succ)
-            for child in elem.children:
-                for v in self.DF[child]:
-                    if v.idom != elem:
-                        self.DF[elem].add(v)
+            self.DF[elem.index] = self.local_DF(elem)
+
+    def local_DF(self, elem):
+        # DF вершины по ее преемникам и DF ее детей в дереве доминаторов
+        df = set()
+        for succ in elem.output_vertexes:
+            if succ.idom is not elem:
+                df.add(succ.index)
+        for child in elem.children:
+            for i in self.DF[child.index]:
+                if self.vertexes[i].idom is not elem:
+                    df.add(i)
+        return df
 
     def dfs(self):
         # Обход графа в глубину для нумерации вершин
@@ -71,6 +156,8 @@ class Graph:
 
         while len(stack) != 0:
             current = stack.pop()
+            if current.checked:
+                continue
             current.checked = True
             current.dfs_number = n
             n += 1
@@ -79,11 +166,14 @@ class Graph:
                     stack.append(next)
 
     def print_graph(self):
-        print("digraph g{")
-        print("\tnode [shape = box]")
+        self.write_graph(sys.stdout)
+
+    def write_graph(self, out):
+        # Вывод графа в формате Graphviz в любой текстовый поток, вершина за вершиной
+        out.write("digraph g{\n\tnode [shape = box]\n")
         for elem in self.vertexes:
-            elem.to_graph()
-        print("}")
+            elem.write_graph(out)
+        out.write("}\n")
 
     def generate_post_order(self):
         # Генерация списка вершин в порядке обхода в глубину
@@ -92,24 +182,275 @@ class Graph:
         return self.generate_post_order_from(self.vertexes[0])
 
     def generate_post_order_from(self, start):
-        # Генерация списка вершин в порядке обхода в глубину, начиная с вершины start
-        if len(start.output_vertexes) == 0:
-            if start.checked:
-                return []
-            start.checked = True
-            return [start]
-        else:
-            if start.checked:
-                return []
-            start.checked = True
-            result = []
-            for elem in start.output_vertexes:
-                local_post_order = self.generate_post_order_from(elem)
-                result += local_post_order
-            result.append(start)
-            return result
+        # Генерация списка вершин в порядке обхода в глубину, начиная с вершины start.
+        # Вместо рекурсии используется стек пар (вершина, итератор преемников).
+        if start.checked:
+            return []
+        start.checked = True
+        result = []
+        stack = [(start, iter(start.output_vertexes))]
+        while stack:
+            current, successors = stack[-1]
+            for succ in successors:
+                if not succ.checked:
+                    succ.checked = True
+                    stack.append((succ, iter(succ.output_vertexes)))
+                    break
+            else:
+                stack.pop()
+                result.append(current)
+        return result
+
+    def generate_reverse_post_order(self):
+        order = self.generate_post_order()
+        order.reverse()
+        return order
+
+    def dominator_tree_walk(self, root):
+        # Обход дерева доминаторов без рекурсии.
+        # Выдает пары (вершина, True) при входе и (вершина, False) после обхода всех детей.
+        stack = [(root, True)]
+        while stack:
+            current, entering = stack.pop()
+            yield current, entering
+            if entering:
+                stack.append((current, False))
+                for child in reversed(current.children):
+                    stack.append((child, True))
+
+    def dominator_tree_pre_order(self, root=None):
+        if root is None:
+            root = self.vertexes[0]
+        return [v for v, entering in self.dominator_tree_walk(root) if entering]
 
     def build_dominators_tree(self):
+        # Итеративный алгоритм Купера-Харви-Кеннеди над номерами вершин в обратном post-order
+        order = self.generate_reverse_post_order()
+        idom = self.dominators_in_order(order)
+        for elem in self.vertexes:
+            elem.idom = None
+            elem.children = []
+        for b in range(1, len(order)):
+            order[b].idom = order[idom[b]]
+        # Дети добавляются в порядке создания вершин, как и раньше
+        for elem in self.vertexes:
+            if elem.idom is not None:
+                elem.idom.add_child(elem)
+
+    @staticmethod
+    def dominators_in_order(order):
+        # Номера непосредственных доминаторов для вершин в обратном post-order от order[0].
+        # Предшественники вне order не учитываются.
+        index = {v: i for i, v in enumerate(order)}
+        preds = [[index[p] for p in v.input_vertexes if p in index] for v in order]
+        idom = [None] * len(order)
+        idom[0] = 0
+        changed = True
+        while changed:
+            changed = False
+            for b in range(1, len(order)):
+                new_idom = None
+                for p in preds[b]:
+                    if idom[p] is None:
+                        continue
+                    if new_idom is None:
+                        new_idom = p
+                        continue
+                    # Поиск ближайшего общего предка двух вершин в текущем дереве
+                    f1, f2 = p, new_idom
+                    while f1 != f2:
+                        while f1 > f2:
+                            f1 = idom[f1]
+                        while f2 > f1:
+                            f2 = idom[f2]
+                    new_idom = f1
+                if idom[b] != new_idom:
+                    idom[b] = new_idom
+                    changed = True
+        return idom
+
+    def is_reachable(self, v):
+        return v is self.vertexes[0] or v.idom is not None
+
+    def common_dominator(self, a, b):
+        # Ближайший общий предок двух вершин в дереве доминаторов
+        ancestors = set()
+        while a is not None:
+            ancestors.add(a)
+            a = a.idom
+        while b not in ancestors:
+            b = b.idom
+        return b
+
+    def insert_edge(self, from_v, to_v):
+        # Добавление ребра в граф с готовыми доминаторами и DF.
+        # Ф-функциям вершины to_v вызывающий добавляет аргумент для нового, последнего, места.
+        self.revision += 1
+        from_v.add_output_connector(to_v)
+        to_v.add_input_connector(from_v)
+        if not self.is_reachable(from_v):
+            return
+        if not self.is_reachable(to_v):
+            # Стали достижимы новые вершины
+            self.build_dominators_tree()
+            self.make_DF()
+            return
+        nca = self.common_dominator(from_v, to_v)
+        depth = {self.vertexes[0]: 0}
+        nca_depth = self.tree_depth(nca, depth)
+        # Поиск по глубинам: idom меняется (и становится равным nca) только у вершин,
+        # достижимых из to_v по вершинам глубже их прежнего idom, с idom глубже nca.
+        # Внутри поддерева вершины все глубже нее, поэтому из вершины сразу переходим
+        # к выходам из ее поддерева - к ее прежней DF.
+        affected = []
+        if self.tree_depth(to_v, depth) > nca_depth + 1:
+            visited = {to_v}
+            queue = [(-self.tree_depth(to_v, depth), to_v.index, to_v)]
+            while queue:
+                z_depth, _, z = heapq.heappop(queue)
+                affected.append(z)
+                stack = [z]
+                while stack:
+                    u = stack.pop()
+                    for i in self.DF[u.index]:
+                        w = self.vertexes[i]
+                        if w in visited:
+                            continue
+                        w_depth = self.tree_depth(w, depth)
+                        if w_depth > -z_depth:
+                            visited.add(w)
+                            stack.append(w)
+                        elif w_depth > nca_depth + 1:
+                            visited.add(w)
+                            heapq.heappush(queue, (-w_depth, w.index, w))
+        changed = [from_v]
+        for z in affected:
+            changed.append(z.idom)
+            z.idom.children.remove(z)
+            z.idom = nca
+            nca.children.append(z)
+        if affected:
+            changed.append(nca)
+            nca.children.sort(key=lambda v: v.index)
+        self.update_DF(changed)
+
+    @staticmethod
+    def tree_depth(v, depth):
+        # Глубина вершины в дереве доминаторов; depth - словарь уже известных глубин
+        chain = []
+        while v not in depth:
+            chain.append(v)
+            v = v.idom
+        d = depth[v]
+        for u in reversed(chain):
+            d += 1
+            depth[u] = d
+        return d
+
+    def update_DF(self, changed):
+        # Пересчет DF вершин changed; DF предка пересчитывается, только если изменилась DF ребенка.
+        # Вершины обрабатываются от глубоких к корню, поэтому дети всегда раньше родителя.
+        depth = {self.vertexes[0]: 0}
+        queue = []
+        queued = set()
+        for v in changed:
+            if v not in queued:
+                queued.add(v)
+                heapq.heappush(queue, (-self.tree_depth(v, depth), v.index, v))
+        while queue:
+            v_depth, _, v = heapq.heappop(queue)
+            df = self.local_DF(v)
+            if df == self.DF.get(v.index):
+                continue
+            self.DF[v.index] = df
+            parent = v.idom
+            if parent is not None and parent not in queued:
+                queued.add(parent)
+                heapq.heappush(queue, (v_depth + 1, parent.index, parent))
+
+    def remove_edge(self, from_v, to_v):
+        # Удаление ребра из графа с готовыми доминаторами и DF.
+        # Из ф-функций вершины to_v удаляется аргумент этого ребра.
+        self.disconnect(from_v, to_v)
+        if not self.is_reachable(from_v) or from_v in to_v.pred_slots:
+            # Ребро из недостижимой вершины или одно из параллельных ребер
+            return
+        if self.common_dominator(from_v, to_v) is to_v:
+            # Обратное ребро: все пути через него уже проходят через to_v
+            self.update_DF([from_v])
+            return
+        # Если idom меняется хоть у одной вершины, то и у to_v, и все такие вершины - дети idom(to_v)
+        root = to_v.idom
+        region = self.dominator_tree_pre_order(root)
+        order = self.region_post_order(root, set(region))
+        if len(order) != len(region):
+            # Часть вершин стала недостижимой
+            self.build_dominators_tree()
+            self.make_DF()
+            return
+        # Доминаторы пересчитываются алгоритмом Купера-Харви-Кеннеди только в поддереве root:
+        # все предшественники его вершин, кроме root, лежат в нем же
+        order.reverse()
+        idom = self.dominators_in_order(order)
+        changed = [from_v]
+        for b in range(1, len(order)):
+            v = order[b]
+            new_idom = order[idom[b]]
+            if v.idom is not new_idom:
+                changed += (v.idom, new_idom)
+                v.idom.children.remove(v)
+                v.idom = new_idom
+                new_idom.children.append(v)
+                new_idom.children.sort(key=lambda u: u.index)
+        self.update_DF(changed)
+
+    def disconnect(self, from_v, to_v):
+        # Удаление ребра без обновления доминаторов и DF.
+        # Из ф-функций вершины to_v удаляется аргумент этого ребра.
+        self.revision += 1
+        from_v.remove_output_connector(to_v)
+        slot = to_v.remove_input_connector(from_v)
+        for stmt in to_v.block:
+            if stmt.type != IR.PHI:
+                break
+            self.def_use.remove(to_v, stmt)
+            del stmt.arguments[slot]
+            self.def_use.add(to_v, stmt)
+
+    def remove_vertexes(self, dead):
+        # Удаление вершин, у которых уже нет ребер. Индексы оставшихся вершин сдвигаются,
+        # поэтому DF сбрасывается: вызывающий строит доминаторы и DF заново.
+        self.revision += 1
+        dead = set(dead)
+        for v in dead:
+            for stmt in v.block:
+                self.def_use.remove(v, stmt)
+        self.vertexes = [v for v in self.vertexes if v not in dead]
+        for i, v in enumerate(self.vertexes):
+            v.index = i
+        self.DF = {}
+
+    @staticmethod
+    def region_post_order(start, region):
+        # Post-order вершин region, достижимых из start по ребрам внутри region
+        visited = {start}
+        result = []
+        stack = [(start, iter(start.output_vertexes))]
+        while stack:
+            current, successors = stack[-1]
+            for succ in successors:
+                if succ in region and succ not in visited:
+                    visited.add(succ)
+                    stack.append((succ, iter(succ.output_vertexes)))
+                    break
+            else:
+                stack.pop()
+                result.append(current)
+        return result
+
+    def build_dominators_tree_naive(self):
+        # Исходный алгоритм: удаление каждой вершины и обход графа, O(V * (V + E)).
+        # Требует нумерации вершин методом dfs.
         first = self.vertexes[0]
         dominators = {}
         stack = []
@@ -135,38 +476,25 @@ class Graph:
                 if maximum is None or maximum.dfs_number < v.dfs_number:
                     maximum = v
             elem.idom = maximum
+        for elem in self.vertexes:
+            elem.children = []
         for elem in self.vertexes:
             if elem.idom is not None:
                 elem.idom.add_child(elem)
 
-    def get_all_assign(self, s):
-        # Получение всех вершин, содержащих оператор присваивания переменной s
-        result = set()
-        for elem in self.vertexes:
-            for opp in elem.block:
-                if opp.type == IR.ASSIGN and opp.value == s:
-                    result.add(elem)
-        return result
-
-    def make_df_set(self, s):
-        # Формирование множества DF для множества вершин s
-        result = set()
-        for elem in s:
-            localResult = self.DF[elem]
-            result = result.union(localResult)
-        return result
-
     def make_dfp(self, s):
         # размещение ф-функций
-
-        changed = True
-        dfp = self.make_df_set(s)
-        prev = dfp.copy()
-        while changed:
-            changed = False
-            s = s.union(dfp)
-            dfp = self.make_df_set(s)
-            if dfp != prev:
-                changed = True
-                prev = dfp.copy()
-        return dfp
+        # Итерированная граница доминирования через список работ:
+        # каждая вершина попадает в список не более одного раза.
+        dfp = set()
+        visited = {elem.index for elem in s}
+        worklist = list(visited)
+        while worklist:
+            elem = worklist.pop()
+            for v in self.DF[elem]:
+                if v not in dfp:
+                    dfp.add(v)
+                    if v not in visited:
+                        visited.add(v)
+                        worklist.append(v)
+        return {self.vertexes[i] for i in dfp}
@@ -0,0 +1,53 @@
+import IR
+
+# Коммутативные операции: порядок операндов в ключе не важен
+COMMUTATIVE = {"+"}
+
+
+def value_key(stmt, replaced):
+    # Ключ вычисления: операция и операнды после замены на их представителей
+    l = replaced.get(stmt.arguments[0], stmt.arguments[0])
+    r = replaced.get(stmt.arguments[1], stmt.arguments[1])
+    if stmt.bin_op in COMMUTATIVE and r < l:
+        l, r = r, l
+    return stmt.bin_op, l, r
+
+
+def number_values(graph):
+    # Глобальная нумерация значений в пределах дерева доминаторов.
+    # Таблица вычислений содержит только операторы доминирующих блоков: при входе
+    # в блок его вычисления добавляются, при выходе из поддерева удаляются.
+    # Повторное вычисление удаляется, а его имя заменяется на имя первого.
+    # Возвращает число удаленных операторов.
+    graph.revision += 1
+    table = {}
+    replaced = {}
+    pushed = {}
+    removed = 0
+    for v, entering in graph.dominator_tree_walk(graph.vertexes[0]):
+        if not entering:
+            for key in pushed.pop(v):
+                del table[key]
+            continue
+        keys = []
+        block = []
+        for stmt in v.block:
+            if stmt.type == IR.ASSIGN and stmt.bin_op is not None:
+                key = value_key(stmt, replaced)
+                leader = table.get(key)
+                if leader is not None:
+                    replaced[stmt.value] = leader
+                    removed += 1
+                    continue
+                table[key] = stmt.value
+                keys.append(key)
+            block.append(stmt)
+        v.block = block
+        pushed[v] = keys
+    if removed:
+        # Использования в ф-функциях могут стоять в блоках, обойденных раньше определения
+        for v in graph.vertexes:
+            for stmt in v.block:
+                stmt.arguments = [replaced.get(arg, arg) for arg in stmt.arguments]
+        graph.def_use.rebuild(graph.vertexes)
+    return removed
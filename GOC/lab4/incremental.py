@@ -0,0 +1,443 @@
+import bisect
+import io
+import itertools
+
+from lexer import Lexer, LINE_BREAK
+from parser import Parser, END
+from nodes import *
+
+
+class RecordingBuilder(Builder):
+    # Builder, запоминающий ребра в порядке создания (от него зависит порядок аргументов ф-функций)
+    def __init__(self, context):
+        super().__init__(context)
+        self.edges = []
+
+    def add_connector(self, from_v, to_v):
+        self.edges.append((from_v.index, to_v.index))
+        super().add_connector(from_v, to_v)
+
+
+# Заготовка части графа, порождаемой одним оператором верхнего уровня, до переименования.
+# Блок 0 - текущий блок, в который попадает начало оператора; остальные блоки новые.
+# Заготовка содержит ф-функции, idom и DF своих блоков: в структурном графе они зависят
+# только от самого оператора, поэтому не меняются при правке других операторов.
+class Fragment:
+    __slots__ = ("blocks", "edges", "final", "idom", "df", "names", "temporaries")
+
+    @staticmethod
+    def build(stmt):
+        context = Context()
+        builder = RecordingBuilder(context)
+        builder.create_block()
+        e = stmt.generate(builder)
+        if e.type != IR.NULL:
+            builder.add_expression(e)
+        graph = context.graph
+        graph.build_dominators_tree()
+        graph.make_DF()
+        context.place_phi()
+        fragment = Fragment()
+        fragment.blocks = [v.block for v in graph.vertexes]
+        fragment.edges = builder.edges
+        fragment.final = context.cur_vertex.index
+        fragment.idom = [None if v.idom is None else v.idom.index for v in graph.vertexes]
+        fragment.df = [graph.DF.get(v.index, set()) for v in graph.vertexes]
+        fragment.names = context.names - context.temporaries
+        # Временные переменные в порядке создания; при копировании получают новые имена
+        fragment.temporaries = sorted(context.temporaries, key=lambda name: int(name[2:]))
+        return fragment
+
+    def instantiate(self, builder, current):
+        # Копирует заготовку в граф builder, начиная с блока current.
+        # Возвращает блок, который становится текущим после оператора.
+        context = builder.context
+        graph = context.graph
+        renamed = {name: context.new_temporary() for name in self.temporaries}
+        vertexes = [current]
+        for stmt in self.blocks[0]:
+            current.insert_tail(self.copy(stmt, renamed))
+        for block in self.blocks[1:]:
+            v = builder.create_block_without()
+            for stmt in block:
+                v.insert_tail(self.copy(stmt, renamed))
+            vertexes.append(v)
+        for a, b in self.edges:
+            builder.add_connector(vertexes[a], vertexes[b])
+        for i in range(1, len(vertexes)):
+            vertexes[i].idom = vertexes[self.idom[i]]
+            vertexes[i].idom.add_child(vertexes[i])
+            graph.DF[vertexes[i].index] = {vertexes[j].index for j in self.df[i]}
+        context.names |= self.names
+        context.cur_vertex = vertexes[self.final]
+        return context.cur_vertex
+
+    @staticmethod
+    def copy(stmt, renamed):
+        stmt = stmt.copy()
+        if renamed:
+            stmt.value = renamed.get(stmt.value, stmt.value)
+            stmt.arguments = [renamed.get(arg, arg) for arg in stmt.arguments]
+        return stmt
+
+
+# Часть готового графа, порожденная одним оператором верхнего уровня (или return).
+# entry - блок, в котором оператор начинается, head - его операторы в entry,
+# blocks - собственные блоки оператора, final - текущий блок после оператора.
+# defs - версии переменных на выходе оператора, reads - версии, прочитанные им снаружи.
+class Statement:
+    __slots__ = ("entry", "head", "blocks", "final", "defs", "reads")
+
+    @staticmethod
+    def capture(builder, generate):
+        # Записывает часть графа, которую generate() строит от текущего блока builder
+        graph = builder.context.graph
+        record = Statement()
+        record.entry = builder.current_block()
+        start = len(record.entry.block)
+        first = len(graph.vertexes)
+        generate()
+        record.head = record.entry.block[start:]
+        record.blocks = graph.vertexes[first:]
+        record.final = builder.current_block()
+        return record
+
+    def own(self, v):
+        # Операторы записи в вершине v; в final после ее ф-функций идут следующие операторы
+        if v is self.entry:
+            return self.head
+        if v is self.final:
+            return list(itertools.takewhile(lambda stmt: stmt.type == IR.PHI, v.block))
+        return v.block
+
+    def placed(self):
+        # Пары (вершина, оператор) записи
+        return [(v, stmt) for v in [self.entry] + self.blocks for stmt in self.own(v)]
+
+    def collect(self):
+        # defs и reads по переименованным операторам.
+        # Версия на выходе - последнее определение на пути по idom от final к entry.
+        placed = self.placed()
+        defined = {stmt.value for v, stmt in placed if stmt.type == IR.ASSIGN or stmt.type == IR.PHI}
+        self.reads = {arg for v, stmt in placed for arg in stmt.arguments
+                      if IR.is_variable(arg) and arg not in defined}
+        self.defs = {}
+        v = self.final
+        while True:
+            for stmt in reversed(self.own(v)):
+                if stmt.type == IR.ASSIGN or stmt.type == IR.PHI:
+                    name = base_name(stmt.value)
+                    # Временные переменные не видны за пределами оператора
+                    if name[0] != "_":
+                        self.defs.setdefault(name, stmt.value)
+            if v is self.entry:
+                break
+            v = v.idom
+
+
+def token_offsets(text, tokens, base=0):
+    # Смещения токенов в тексте по номерам строк и позициям
+    line_starts = [0] + [br.end() for br in LINE_BREAK.finditer(text)]
+    return [base + line_starts[t.line - 1] + t.position - 1 for t in tokens]
+
+
+def common_prefix(a, b):
+    # Длина общего начала строк; срезы сравниваются двоичным поиском, само сравнение идет в C
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix(a, b, limit):
+    # Длина общего конца строк, не больше limit
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def joined(text, pos):
+    # Токены слева и справа от pos слились бы в один
+    return 0 < pos < len(text) and text[pos - 1].isalnum() and text[pos].isalnum()
+
+
+class IncrementalCompiler:
+    # Повторная компиляция изменяемой программы. Компилятор хранит граф прошлой версии и
+    # для каждого оператора верхнего уровня - его место в тексте и в графе. При правке
+    # внутри операторов заново разбираются и строятся только затронутые операторы:
+    # их блоки заменяются в графе, idom и DF берутся из заготовок, переименование идет
+    # только по новым операторам, а в следующих операторах меняются лишь использования
+    # версий, которые правка изменила. Номера версий при этом могут отличаться от полной
+    # компиляции. Правка заголовка или return компилирует программу заново.
+    # Граф изменяется на месте при следующей правке.
+    def __init__(self):
+        self.text = None
+        self.graph = None
+        self.reused = 0
+        self.rebuilt = 0
+
+    def compile(self, text):
+        if not isinstance(text, str):
+            text = "".join(text)
+        if text == self.text:
+            self.reused, self.rebuilt = len(self.statements), 0
+            return self.graph
+        if self.graph is None or not self.patch(text):
+            self.build(text)
+        self.text = text
+        return self.graph
+
+    def build(self, text):
+        # Полная компиляция с записью частей графа по операторам
+        positions = []
+        function = Parser(Lexer(text + "$", lazy=True).tokenize()).parse_function(positions)
+        context = Context()
+        builder = Builder(context)
+        builder.create_block()
+        builder.create_block()
+        statements = [Statement.capture(builder, lambda: Block([stmt]).generate(builder))
+                      for stmt in function.body.exprs]
+        ret = Statement.capture(builder, lambda: function.generate_return(builder))
+        graph = context.graph
+        graph.dfs()
+        graph.build_dominators_tree()
+        graph.make_DF()
+        context.place_phi()
+        context.change_numeration()
+        for record in statements:
+            record.collect()
+        ret.collect()
+        offsets = token_offsets(text, positions)
+        self.context, self.graph = context, graph
+        self.statements, self.ret = statements, ret
+        self.starts, self.body_end = offsets[:-1], offsets[-1]
+        self.reused, self.rebuilt = 0, len(statements)
+
+    def patch(self, text):
+        # Правка внутри операторов верхнего уровня. Затронутыми считаются операторы,
+        # отрезки которых (вместе с пробелами после них) пересекают измененный участок.
+        # Возвращает False, если так правку обработать нельзя.
+        old, starts = self.text, self.starts
+        if not starts:
+            return False
+        prefix = common_prefix(old, text)
+        suffix = common_suffix(old, text, min(len(old), len(text)) - prefix)
+        old_end = len(old) - suffix
+        delta = len(text) - len(old)
+        if prefix < starts[0] or old_end > self.body_end:
+            return False
+        i = max(bisect.bisect_left(starts, prefix) - 1, 0)
+        j = bisect.bisect_right(starts, old_end)
+        begin = starts[i]
+        end = (starts[j] if j < len(starts) else self.body_end) + delta
+        if joined(text, begin) or joined(text, end):
+            return False
+        segment = text[begin:end]
+        positions = []
+        try:
+            parser = Parser(Lexer(segment + "$", lazy=True, messages=io.StringIO()).tokenize())
+            parser.next_token()
+            exprs = parser.parse_block(positions).exprs
+            parser.check(END)
+            fragments = [Fragment.build(stmt) for stmt in exprs]
+        except Exception:
+            # Ошибку в тексте сообщит полная компиляция
+            return False
+        self.graph.revision += 1
+        self.replace(i, j, fragments)
+        self.starts = starts[:i] + token_offsets(segment, positions, begin) + [s + delta for s in starts[j:]]
+        self.body_end += delta
+        self.reused, self.rebuilt = len(self.statements) - len(fragments), len(fragments)
+        return True
+
+    def replace(self, i, j, fragments):
+        # Замена операторов i..j-1 графа операторами из заготовок
+        graph = self.graph
+        def_use = graph.def_use
+        records = self.statements
+        old = records[i:j]
+        entry, last = old[0].entry, old[-1].final
+        before = {}
+        owned = set()
+        for record in old:
+            before.update(record.defs)
+            for v, stmt in record.placed():
+                def_use.remove(v, stmt)
+                owned.add(stmt)
+
+        # Отделение старых операторов: в entry остается начало блока, операторы
+        # следующих записей из last, ее ребра и дети в дереве доминаторов переносятся
+        # в новый final
+        start = len(entry.block)
+        if old[0].head:
+            start = next(k for k, stmt in enumerate(entry.block) if stmt is old[0].head[0])
+        tail = [stmt for stmt in last.block[start if last is entry else 0:] if stmt not in owned]
+        later = last.children
+        del entry.block[start:]
+        successors = last.output_vertexes
+        entry.output_vertexes = []
+        entry.children = []
+        removed = [v for record in old for v in record.blocks]
+        if removed:
+            a = removed[0].index
+        else:
+            a = next((record.blocks[0].index for record in itertools.islice(records, j, None) if record.blocks),
+                     len(graph.vertexes))
+
+        context = self.context
+        context.cur_vertex = entry
+        builder = Builder(context)
+        created = len(graph.vertexes)
+        new = [Statement.capture(builder, lambda: fragment.instantiate(builder, builder.current_block()))
+               for fragment in fragments]
+        final = builder.current_block()
+        final.block += tail
+        final.output_vertexes = successors
+        for succ in successors:
+            if final is not last:
+                slot = succ.pred_slots.pop(last)
+                succ.input_vertexes[slot] = final
+                succ.pred_slots[final] = slot
+        for child in later:
+            child.idom = final
+        final.children += later
+        if final is not last:
+            for stmt in tail:
+                def_use.remove(last, stmt)
+                def_use.add(final, stmt)
+            for record in itertools.chain(itertools.islice(records, j, None), [self.ret]):
+                if record.entry is not last:
+                    break
+                record.entry = final
+                if record.final is last:
+                    record.final = final
+        self.place(a, removed, created)
+
+        records[i:j] = new
+        for v, stmt in [pair for record in new for pair in record.placed()]:
+            def_use.remove(v, stmt)
+        after = {}
+        for k in range(i, i + len(new)):
+            self.rename(k)
+            after.update(records[k].defs)
+        for record in new:
+            for v, stmt in record.placed():
+                def_use.add(v, stmt)
+        for name in before.keys() | after.keys():
+            incoming = self.incoming(i, name)
+            was, now = before.get(name, incoming), after.get(name, incoming)
+            if was != now:
+                self.propagate(i + len(new), name, was, now)
+
+    def place(self, a, removed, created):
+        # Новые вершины из конца списка встают на место удаленных; индексы и номера
+        # следующих вершин сдвигаются, DF переписывается на новые индексы
+        graph = self.graph
+        vertexes = graph.vertexes
+        DF = graph.DF
+        new = vertexes[created:]
+        del vertexes[created:]
+        new_df = [DF.pop(v.index) for v in new]
+        for v in removed:
+            DF.pop(v.index, None)
+        shift = len(new) - len(removed)
+        if shift:
+            moved = [(k, df) for k, df in DF.items() if k >= a + len(removed)]
+            for k, df in moved:
+                del DF[k]
+            for k, df in moved:
+                DF[k + shift] = {x + shift for x in df}
+        positions = {v.index: a + k for k, v in enumerate(new)}
+        vertexes[a:a + len(removed)] = new
+        for k in range(a, len(vertexes) if shift else a + len(new)):
+            vertexes[k].index = vertexes[k].number = k
+        for v, df in zip(new, new_df):
+            DF[v.index] = {positions[x] for x in df}
+
+    def incoming(self, k, name):
+        # Версия name перед k-м оператором; у переменной без определения - само имя
+        records = self.statements
+        for n in range(k - 1, -1, -1):
+            version = records[n].defs.get(name)
+            if version is not None:
+                return version
+        return name
+
+    def rename(self, k):
+        # Переименование k-го оператора обходом дерева доминаторов по его блокам.
+        # Версии снаружи берутся из defs предыдущих операторов, новые версии получают
+        # следующие свободные номера.
+        record = self.statements[k]
+        counters = self.context.counters
+        own = set(record.blocks)
+        stacks = {}
+        incoming = {}
+
+        def version(arg):
+            if not IR.is_variable(arg):
+                return arg
+            stack = stacks.get(arg)
+            if stack:
+                return stack[-1]
+            if arg not in incoming:
+                incoming[arg] = self.incoming(k, arg)
+            return incoming[arg]
+
+        pushed = {}
+        walk = [(record.entry, True)]
+        while walk:
+            v, entering = walk.pop()
+            if not entering:
+                for name in pushed.pop(v):
+                    stacks[name].pop()
+                continue
+            walk.append((v, False))
+            walk += [(child, True) for child in reversed(v.children) if child in own]
+
+            defined = []
+            for stmt in record.own(v):
+                if stmt.type != IR.PHI:
+                    stmt.arguments = [version(arg) for arg in stmt.arguments]
+                if stmt.type == IR.ASSIGN or stmt.type == IR.PHI:
+                    name = stmt.value
+                    n = counters.get(name, 0)
+                    counters[name] = n + 1
+                    stmt.value = version_name(name, n)
+                    stacks.setdefault(name, []).append(stmt.value)
+                    defined.append(name)
+            pushed[v] = defined
+
+            for succ in v.output_vertexes:
+                if succ not in own:
+                    continue
+                j = succ.pred_slots[v]
+                for stmt in succ.block:
+                    if stmt.type != IR.PHI:
+                        break
+                    stmt.arguments[j] = version(stmt.arguments[j])
+        record.collect()
+
+    def propagate(self, k, name, was, now):
+        # Замена версии was на now в операторах начиная с k-го, пока name не определена заново
+        def_use = self.graph.def_use
+        records = self.statements
+        for record in itertools.chain(itertools.islice(records, k, None), [self.ret]):
+            if was in record.reads:
+                for v, stmt in record.placed():
+                    if was in stmt.arguments:
+                        def_use.remove(v, stmt)
+                        stmt.arguments = [now if arg == was else arg for arg in stmt.arguments]
+                        def_use.add(v, stmt)
+                record.reads.discard(was)
+                record.reads.add(now)
+            if name in record.defs:
+                break
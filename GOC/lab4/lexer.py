@@ -1,7 +1,12 @@
 import re
 
+# Разделители строк, которые учитывает str.splitlines().
+LINE_BREAK = re.compile(r'\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]')
+
 
 class Token:
+    __slots__ = ("token_type", "value", "line", "position")
+
     def __init__(self, token_type, value, line, position):
         self.token_type = token_type
         self.value = value
@@ -13,9 +18,16 @@ class Token:
 
 
 class Lexer:
-    def __init__(self, text):
+    def __init__(self, text, scanner=True, lazy=False, messages=None):
         # Конструктор класса Lexer. Принимает исходный текст (text) для лексического анализа.
+        # text может быть строкой или итератором строк (например, открытым файлом).
+        # scanner=True включает разбор одним скомпилированным регулярным выражением.
+        # lazy=True возвращает токены по мере чтения, не накапливая их в self.tokens.
+        # messages - поток для сообщений об ошибках, по умолчанию sys.stdout.
         self.text = text
+        self.messages = messages
+        self.scanner = scanner
+        self.lazy = lazy
         self.line = 1
         self.position = 1
         self.tokens = []
@@ -36,10 +48,61 @@ class Lexer:
             ('END', r'\$'),
             ('SPACE', r'\s+')
         ]
+        # Общее регулярное выражение из всех правил с именованными группами.
+        # Порядок альтернатив совпадает с порядком правил, поэтому результат тот же.
+        self.master = re.compile('|'.join('(?P<%s>%s)' % rule for rule in self.rules))
 
     def tokenize(self):
-        lines = self.text.splitlines()
-        for line_num, line in enumerate(lines):
+        tokens = self.tokenize_scanner() if self.scanner else self.tokenize_rules()
+        if self.lazy:
+            return tokens
+        for token in tokens:
+            self.tokens.append(token)
+        return iter(self.tokens)
+
+    def lines(self):
+        # Итератор по строкам исходного текста
+        if isinstance(self.text, str):
+            return iter(self.text.splitlines())
+        return iter(self.text)
+
+    def tokenize_scanner(self):
+        # Строка разбирается целиком, итератор строк - построчно.
+        if isinstance(self.text, str):
+            self.line = 1
+            yield from self.scan(self.text)
+        else:
+            for line_num, line in enumerate(self.text):
+                self.line = line_num + 1
+                yield from self.scan(line)
+
+    def scan(self, text):
+        # Разбор текста за один проход без копирования остатка строки.
+        match = self.master.match
+        line_start = 0
+        pos = 0
+        while pos < len(text):
+            m = match(text, pos)
+            if m is None:
+                self.position = pos - line_start + 1
+                self.error()
+            kind = m.lastgroup
+            if kind != 'SPACE':
+                yield Token(kind, m.group(), self.line, pos - line_start + 1)
+            else:
+                for br in LINE_BREAK.finditer(text, pos, m.end()):
+                    self.line += 1
+                    line_start = br.end()
+            pos = m.end()
+
+    def error(self):
+        for token in self.tokens:
+            print(token, file=self.messages)
+        print(f'lexer error ({self.line}, {self.position})\n', file=self.messages)
+        raise ValueError
+
+    def tokenize_rules(self):
+        for line_num, line in enumerate(self.lines()):
             self.position = 1
             self.line = line_num + 1
             while self.position < len(line) + 1:
@@ -48,16 +111,11 @@ class Lexer:
                     if match:
                         if rule[0] != 'SPACE':
                             value = match.group()
-                            self.tokens.append(Token(rule[0], value, self.line, self.position))
+                            yield Token(rule[0], value, self.line, self.position)
                         self.position += match.end()
                         break
                 else:
-                    for token in self.tokens:
-                        print(token)
-                    print(f'lexer error ({self.line}, {self.position})\n')
-                    raise ValueError
-
-        return iter(self.tokens)
+                    self.error()
 
 
 if __name__ == "__main__":
@@ -1,14 +1,34 @@
-from lexer import Lexer
-from parser import Parser
+import argparse
+import sys
+
+from compiler import compile_source, open_cache
+from dot import dump_dot
+from optimize import parse_passes
+from vm import execute
 
 if __name__ == "__main__":
-    with open("input.txt") as file:
-        text = file.read()
-    lexer = Lexer(text + "$")
-    try:
-        tokens = lexer.tokenize()
-        parser = Parser(tokens)
-        main_func = parser.parse_function()
-        main_func.generate()
-    except ValueError as v:
-        print(v)
+    arg_parser = argparse.ArgumentParser(description="Компиляция программы в SSA-граф")
+    arg_parser.add_argument("path", nargs="?", default="input.txt", help="файл с программой")
+    arg_parser.add_argument("--cache", help="каталог кэша скомпилированных графов")
+    arg_parser.add_argument("-o", "--output", help="файл для графа (.gz - со сжатием), иначе stdout")
+    arg_parser.add_argument("--passes", default="", type=parse_passes,
+                            help="проходы оптимизации через запятую или all")
+    arg_parser.add_argument("--run", action="store_true", help="выполнить программу и напечатать результат")
+    arg_parser.add_argument("--stats", action="store_true", help="печатать в stderr счетчики проходов")
+    args = arg_parser.parse_args()
+    with open(args.path) as file:
+        # Файл читается построчно, токены передаются парсеру по мере разбора
+        try:
+            stats = {}
+            graph = compile_source(file, open_cache(args.cache), args.passes, stats)
+            if args.stats:
+                for name, count in stats.items():
+                    print(f"{name}: {count} changed", file=sys.stderr)
+            if args.run:
+                print(execute(graph))
+            elif args.output:
+                dump_dot(graph, args.output)
+            else:
+                graph.write_graph(sys.stdout)
+        except ValueError as v:
+            print(v)
@@ -0,0 +1,122 @@
+import weakref
+
+import IR
+
+# Наибольшая вложенность ветвлений, встраиваемых в тело состояния; глубже блоки
+# становятся отдельными состояниями (ограничение отступов в исходном тексте Python)
+MAX_DEPTH = 40
+# Скомпилированные функции по графам: граф -> (Graph.revision, функция).
+# Функция прежней версии графа после его изменения не используется.
+FUNCTIONS = weakref.WeakKeyDictionary()
+
+
+class SourceBuilder:
+    # Перевод графа в SSA-форме в текст функции Python.
+    # Версии переменных становятся локальными переменными, ф-функции - присваиваниями
+    # на ребрах. Блок с одним входом встраивается в блок-предшественник; остальные блоки
+    # становятся состояниями цикла while, выбор состояния - дерево сравнений номера.
+    def __init__(self, graph):
+        self.graph = graph
+        self.defined = {stmt.value for v in graph.vertexes for stmt in v.block
+                        if stmt.type == IR.ASSIGN or stmt.type == IR.PHI}
+        self.states = {}
+        self.worklist = []
+
+    def operand(self, arg):
+        # Переменная без определения (например, в ф-функции на пути, где ее нет) - None
+        if not IR.is_variable(arg):
+            return str(arg)
+        return "v_" + arg if arg in self.defined else "None"
+
+    def expression(self, stmt):
+        if stmt.bin_op is None:
+            return self.operand(stmt.arguments[0])
+        if stmt.bin_op != "+" and stmt.bin_op != "-":
+            raise ValueError(f"unsupported operation {stmt.bin_op!r}")
+        return self.operand(stmt.arguments[0]) + " " + stmt.bin_op + " " + self.operand(stmt.arguments[1])
+
+    def state(self, v):
+        state = self.states.get(v)
+        if state is None:
+            state = self.states[v] = len(self.worklist)
+            self.worklist.append(v)
+        return state
+
+    def emit_edge(self, from_v, to_v, indent, depth, lines):
+        # Присваивания ф-функций ребра выполняются одновременно: кортежное присваивание
+        j = to_v.pred_slots[from_v]
+        targets, values = [], []
+        for stmt in to_v.block:
+            if stmt.type == IR.PHI:
+                targets.append("v_" + stmt.value)
+                values.append(self.operand(stmt.arguments[j]))
+        if targets:
+            lines.append(indent + ", ".join(targets) + " = " + ", ".join(values))
+        if len(to_v.input_vertexes) == 1 and to_v not in self.states and depth < MAX_DEPTH:
+            self.emit_block(to_v, indent, depth, lines)
+        else:
+            lines.append(indent + "state = " + str(self.state(to_v)))
+            lines.append(indent + "continue")
+
+    def emit_block(self, v, indent, depth, lines):
+        condition = None
+        for stmt in v.block:
+            if stmt.type == IR.ASSIGN:
+                lines.append(indent + "v_" + stmt.value + " = " + self.expression(stmt))
+            elif stmt.type == IR.CMP:
+                condition = self.expression(stmt)
+            elif stmt.type == IR.RETURN:
+                lines.append(indent + "return " + self.expression(stmt))
+                return
+        successors = v.output_vertexes
+        if condition is not None:
+            lines.append(indent + "if " + condition + ":")
+            self.emit_edge(v, successors[0], indent + "    ", depth + 1, lines)
+            lines.append(indent + "else:")
+            self.emit_edge(v, successors[1], indent + "    ", depth + 1, lines)
+        elif successors:
+            self.emit_edge(v, successors[0], indent, depth, lines)
+        else:
+            raise ValueError(f"block {v.number} has no return and no successors")
+
+    def emit_dispatch(self, bodies, lo, hi, indent, lines):
+        # Двоичный поиск тела состояния по его номеру
+        if hi - lo == 1:
+            lines.extend(indent + line for line in bodies[lo])
+            return
+        mid = (lo + hi) // 2
+        lines.append(indent + "if state < " + str(mid) + ":")
+        self.emit_dispatch(bodies, lo, mid, indent + "    ", lines)
+        lines.append(indent + "else:")
+        self.emit_dispatch(bodies, mid, hi, indent + "    ", lines)
+
+    def source(self, name="main"):
+        self.state(self.graph.vertexes[0])
+        bodies = []
+        while len(bodies) < len(self.worklist):
+            lines = []
+            self.emit_block(self.worklist[len(bodies)], "", 0, lines)
+            bodies.append(lines)
+        lines = ["def " + name + "():"]
+        if len(bodies) == 1:
+            # Без циклов и слияний весь граф - одно тело
+            self.emit_dispatch(bodies, 0, 1, "    ", lines)
+        else:
+            lines += ["    state = 0", "    while True:"]
+            self.emit_dispatch(bodies, 0, len(bodies), "        ", lines)
+        return "\n".join(lines) + "\n"
+
+
+def python_source(graph, name="main"):
+    return SourceBuilder(graph).source(name)
+
+
+def compile_graph(graph):
+    # Функция Python без аргументов, вычисляющая программу; компилируется один раз на версию графа
+    revision, function = FUNCTIONS.get(graph, (None, None))
+    if revision != graph.revision:
+        namespace = {}
+        exec(compile(python_source(graph), "<ssa>", "exec"), namespace)
+        function = namespace["main"]
+        FUNCTIONS[graph] = (graph.revision, function)
+    return function
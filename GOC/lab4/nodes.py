@@ -1,9 +1,6 @@
 from context import *
 from builder import *
 
-context = Context()
-builder = Builder(context)
-
 
 class Assign:
     def __init__(self, variable, value):
@@ -13,11 +10,11 @@ class Assign:
     def __str__(self):
         return str(self.variable) + " = " + str(self.value)
 
-    def generate(self):
+    def generate(self, builder):
         # Генерирует промежуточное представление
         name = self.variable.name
         builder.context.names.add(name)
-        value = self.value.generate()
+        value = self.value.generate(builder)
         expr = IR.IR(IR.ASSIGN, name)
         if isinstance(value, BinOp):
             expr.add_argument(value.l)
@@ -38,9 +35,9 @@ class Block:
             result += str(expr) + "\n"
         return result + ")"
 
-    def generate(self):
+    def generate(self, builder):
         for expr in self.exprs:
-            e = expr.generate()
+            e = expr.generate(builder)
             if e.type != IR.NULL:
                 builder.add_expression(e)
         return IR.IR.create_empty_expr()
@@ -53,12 +50,41 @@ class BinOp:
         self.r = r
 
     def __str__(self):
-        return str(self.l) + " " + self.op + " " + str(self.r)
-
-    def generate(self):
-        l = self.l.generate()
-        r = self.r.generate()
-        return BinOp(self.op, l, r)
+        # Обход без рекурсии: длинные цепочки операций дают глубокие деревья
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, BinOp):
+                stack += (node.r, " " + node.op + " ", node.l)
+            else:
+                parts.append(str(node))
+        return "".join(parts)
+
+    def generate(self, builder):
+        # Понижение до трехадресного кода: каждая вложенная операция вычисляется
+        # во временную переменную, результат - BinOp с простыми операндами.
+        # Дерево обходится без рекурсии.
+        results = []
+        stack = [(self, False)]
+        while stack:
+            node, done = stack.pop()
+            if not isinstance(node, BinOp):
+                results.append(node.generate(builder))
+            elif done:
+                r = results.pop()
+                l = results.pop()
+                if node is self:
+                    return BinOp(node.op, l, r)
+                name = builder.context.new_temporary()
+                expr = IR.IR(IR.ASSIGN, name)
+                expr.add_argument(l)
+                expr.add_argument(r)
+                expr.add_bin_op(node.op)
+                builder.add_expression(expr)
+                results.append(name)
+            else:
+                stack += ((node, True), (node.r, False), (node.l, False))
 
 
 class IfExpr:
@@ -74,10 +100,10 @@ class IfExpr:
         else:
             return "if (" + str(self.cond) + ") {" + str(self.then_br) + "}"
 
-    def generate(self):
+    def generate(self, builder):
         cond_block = builder.current_block()
         cond_expr = IR.IR(IR.CMP, " ")
-        e = self.cond.generate()
+        e = self.cond.generate(builder)
         if isinstance(e, BinOp):
             cond_expr.add_argument(e.l)
             cond_expr.add_argument(e.r)
@@ -86,13 +112,14 @@ class IfExpr:
             cond_expr.add_argument(e)
         builder.add_expression(cond_expr)
         builder.create_block()
-        self.then_br.generate()
+        self.then_br.generate(builder)
         after_block = builder.create_block()
         if self.has_else:
             builder.set_insert(cond_block)
-            else_block = builder.create_block()
-            self.else_br.generate()
-            builder.add_connector(else_block, after_block)
+            builder.create_block()
+            self.else_br.generate(builder)
+            # Ветка else могла закончиться в другом блоке, если в ней были условия или циклы
+            builder.add_connector(builder.current_block(), after_block)
             builder.set_insert(after_block)
         else:
             builder.add_connector(cond_block, after_block)
@@ -106,7 +133,7 @@ class Ident:
     def __str__(self):
         return self.name
 
-    def generate(self):
+    def generate(self, builder):
         return self.name
 
 
@@ -118,10 +145,10 @@ class WhileExpr:
     def __str__(self):
         return "while (" + str(self.cond) + ") {" + str(self.body) + "}"
 
-    def generate(self):
+    def generate(self, builder):
         header = builder.create_block()
         cond_expr = IR.IR(IR.CMP, " ")
-        e = self.cond.generate()
+        e = self.cond.generate(builder)
         if isinstance(e, BinOp):
             cond_expr.add_argument(e.l)
             cond_expr.add_argument(e.r)
@@ -129,10 +156,11 @@ class WhileExpr:
         else:
             cond_expr.add_argument(e)
         builder.add_expression(cond_expr)
-        body = builder.create_block()
-        self.body.generate()
+        builder.create_block()
+        self.body.generate(builder)
+        body_end = builder.current_block()
         after_block = builder.create_block_without()
-        builder.add_connector(body, header)
+        builder.add_connector(body_end, header)
         builder.add_connector(header, after_block)
         return IR.IR.create_empty_expr()
 
@@ -144,7 +172,7 @@ class Number:
     def __str__(self):
         return str(self.value)
 
-    def generate(self):
+    def generate(self, builder):
         return str(self.value)
 
 
@@ -156,12 +184,25 @@ class Function:
     def __str__(self):
         return "main {" + str(self.body) + str(self.return_expr) + "}"
 
-    def generate(self):
+    def generate(self, builder=None):
+        # Строит граф функции в SSA-форме и возвращает его.
+        # Без builder компиляция идет в новом контексте.
+        if builder is None:
+            builder = Builder(Context())
         builder.create_block()
         builder.create_block()
-        self.body.generate()
+        self.body.generate(builder)
+        self.generate_return(builder)
+        builder.context.graph.dfs()
+        builder.context.graph.build_dominators_tree()
+        builder.context.graph.make_DF()
+        builder.context.place_phi()
+        builder.context.change_numeration()
+        return builder.context.graph
+
+    def generate_return(self, builder):
         expr = IR.IR(IR.RETURN, " ")
-        e = self.return_expr.generate()
+        e = self.return_expr.generate(builder)
         if isinstance(e, BinOp):
             expr.add_argument(e.l)
             expr.add_argument(e.r)
@@ -169,9 +210,3 @@ class Function:
         else:
             expr.add_argument(e)
         builder.add_expression(expr)
-        builder.context.graph.dfs()
-        builder.context.graph.build_dominators_tree()
-        builder.context.graph.make_DF()
-        builder.context.place_phi()
-        builder.context.change_numeration()
-        builder.context.graph.print_graph()
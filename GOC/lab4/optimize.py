@@ -0,0 +1,34 @@
+from copyprop import propagate_copies
+from dce import eliminate_dead_code
+from gvn import number_values
+from sccp import propagate_constants
+
+# Проходы оптимизации над графом в SSA-форме в порядке применения по умолчанию.
+# Каждый проход изменяет граф на месте и возвращает число изменений.
+PASSES = {
+    "sccp": propagate_constants,
+    "copyprop": propagate_copies,
+    "gvn": number_values,
+    "dce": eliminate_dead_code,
+}
+
+
+def optimize(graph, passes=None, stats=None):
+    # Применяет проходы passes (имена из PASSES, по умолчанию все).
+    # Счетчики изменений добавляются в stats и возвращаются.
+    if passes is None:
+        passes = list(PASSES)
+    if stats is None:
+        stats = {}
+    for name in passes:
+        if name not in PASSES:
+            raise ValueError(f"unknown pass {name!r}, expected one of: {', '.join(PASSES)}")
+        stats[name] = stats.get(name, 0) + PASSES[name](graph)
+    return stats
+
+
+def parse_passes(text):
+    # Список проходов из строки вида "sccp,dce"; "all" - все проходы
+    if text == "all":
+        return list(PASSES)
+    return [name for name in text.split(",") if name]
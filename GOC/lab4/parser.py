@@ -15,6 +15,9 @@ EQ = "EQ"
 RETURN = "RETURN"
 END = "END"
 
+# Приоритеты бинарных операторов; операторы одного приоритета левоассоциативны
+PRECEDENCE = {PLUS: 1, MINUS: 1}
+
 class Parser:
     def __init__(self, tokens):
         self.tokens = tokens
@@ -30,13 +33,16 @@ class Parser:
         self.check(token)
         self.next_token()
 
-    def parse_function(self):
+    def parse_function(self, positions=None):
         # Разбирает функцию.
+        # В positions (если задан) записываются первые токены операторов верхнего уровня и токен return.
         self.next_token()
         self.check(IDENT)
         self.next_token()
         self.check_next(L_FIG)
-        body = self.parse_block()
+        body = self.parse_block(positions)
+        if positions is not None:
+            positions.append(self.curToken)
         self.check_next(RETURN)
         return_st = self.parse_atom()
         self.check_next(R_FIG)
@@ -73,21 +79,19 @@ class Parser:
         self.check_next(RIGHT_PAREN)
         return expr
 
-    def parse_bin(self):
-        # Разбирает бинарное выражение.
+    def parse_bin(self, min_precedence=1):
+        # Разбирает бинарное выражение методом подъема по приоритетам.
+        # Операции одного уровня собираются в цикле слева направо, рекурсия идет
+        # только на более высокий приоритет, поэтому ее глубина не зависит от длины выражения.
         left = self.parse_atom()
-        return self.parse_bin_r(left)
-
-    def parse_bin_r(self, left):
-        # Рекурсивно разбирает бинарное выражение с операторами + и -.
-        if self.curToken.token_type != PLUS and self.curToken.token_type != MINUS:
-            return left
-        op = self.curToken.value
-        self.next_token()
-        right = self.parse_atom()
-        if self.curToken.token_type == PLUS or self.curToken.token_type == MINUS:
-            right = self.parse_bin_r(right)
-        return BinOp(op, left, right)
+        while True:
+            precedence = PRECEDENCE.get(self.curToken.token_type, 0)
+            if precedence < min_precedence:
+                return left
+            op = self.curToken.value
+            self.next_token()
+            right = self.parse_bin(precedence + 1)
+            left = BinOp(op, left, right)
 
     def parse_assign(self):
         # Разбирает операцию присваивания.
@@ -120,10 +124,13 @@ class Parser:
         self.check_next(R_FIG)
         return WhileExpr(cond, body)
 
-    def parse_block(self):
+    def parse_block(self, positions=None):
         # Разбирает блок выражений.
+        # В positions (если задан) записывается первый токен каждого оператора.
         exprs = []
         while True:
+            if positions is not None:
+                positions.append(self.curToken)
             if self.curToken.token_type == IF:
                 exprs.append(self.parse_if())
             elif self.curToken.token_type == WHILE:
@@ -131,5 +138,7 @@ class Parser:
             elif self.curToken.token_type == IDENT:
                 exprs.append(self.parse_assign())
             else:
+                if positions is not None:
+                    positions.pop()
                 break
         return Block(exprs)
@@ -0,0 +1,310 @@
+import itertools
+import random
+
+import IR
+from builder import Builder
+from context import Context, base_name, version_name
+from nodes import Assign, BinOp, Ident, IfExpr
+
+# Программы и эталоны, общие для тестов (test_compiler.py) и замеров (bench.py)
+
+
+def generate_program(statements, seed=0):
+    # Генерация большой программы из присваиваний и условных операторов
+    rnd = random.Random(seed)
+    names = ["a", "b", "c", "x", "y", "zed", "tmp", "acc"]
+    lines = ["main {"]
+    for i in range(statements):
+        name = rnd.choice(names)
+        left = rnd.choice(names)
+        right = rnd.choice(names + [str(rnd.randint(1, 999))])
+        if i % 10 == 9:
+            lines.append("    if (" + left + ") {")
+            lines.append("        " + name + " = " + left + " + " + right)
+            lines.append("    }")
+        else:
+            lines.append("    " + name + " = " + left + " " + rnd.choice("+-") + " " + right)
+    lines.append("    return " + names[0])
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def random_program(seed, statements=20):
+    # Случайная программа с вложенными выражениями, условиями и циклами.
+    # Счетчик цикла меняется только в конце тела, поэтому все циклы конечны.
+    rnd = random.Random(seed)
+    # Имена с цифрами на конце проверяют, что версии разных переменных не совпадают
+    names = ["a", "b", "c", "d", "e", "a1", "b11"]
+    counters = itertools.count()
+    lines = ["main {"] + ["    " + name + " = " + str(rnd.randint(1, 9)) for name in names]
+
+    def expr(level=0):
+        terms = []
+        for _ in range(rnd.randint(1, 3)):
+            if level < 2 and rnd.random() < 0.2:
+                terms.append("(" + expr(level + 1) + ")")
+            else:
+                terms.append(rnd.choice(names + [str(rnd.randint(1, 9))]))
+        return (" " + rnd.choice("+-") + " ").join(terms)
+
+    def block(count, indent, level):
+        for _ in range(count):
+            kind = rnd.random()
+            if level < 3 and kind < 0.15:
+                lines.append(indent + "if (" + expr() + ") {")
+                block(rnd.randint(1, 3), indent + "    ", level + 1)
+                if rnd.random() < 0.5:
+                    lines.append(indent + "} else {")
+                    block(rnd.randint(1, 3), indent + "    ", level + 1)
+                lines.append(indent + "}")
+            elif level < 3 and kind < 0.25:
+                k = next(counters)
+                counter = "n"
+                while True:
+                    counter += chr(ord("a") + k % 26)
+                    k //= 26
+                    if k == 0:
+                        break
+                lines.append(indent + counter + " = " + str(rnd.randint(1, 4)))
+                lines.append(indent + "while (" + counter + ") {")
+                block(rnd.randint(1, 3), indent + "    ", level + 1)
+                lines.append(indent + "    " + counter + " = " + counter + " - 1")
+                lines.append(indent + "}")
+            else:
+                lines.append(indent + rnd.choice(names) + " = " + expr())
+
+    block(statements, "    ", 0)
+    lines.append("    return (" + expr() + ")")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def evaluate_ast(function):
+    # Эталонное исполнение программы по дереву разбора
+    env = {}
+
+    def value(node):
+        if isinstance(node, BinOp):
+            l, r = value(node.l), value(node.r)
+            return l + r if node.op == "+" else l - r
+        if isinstance(node, Ident):
+            return env[node.name]
+        return int(node.value)
+
+    def run(block):
+        for stmt in block.exprs:
+            if isinstance(stmt, Assign):
+                env[stmt.variable.name] = value(stmt.value)
+            elif isinstance(stmt, IfExpr):
+                if value(stmt.cond) != 0:
+                    run(stmt.then_br)
+                elif stmt.has_else:
+                    run(stmt.else_br)
+            else:
+                while value(stmt.cond) != 0:
+                    run(stmt.body)
+
+    run(function.body)
+    return value(function.return_expr)
+
+
+def run_graph(graph):
+    # Эталонное исполнение графа в SSA-форме: ф-функции по ребру, с которого пришли
+    values = {}
+
+    def operand(arg):
+        # Ф-функция может получить переменную, не определенную на этом пути
+        return values.get(arg) if IR.is_variable(arg) else int(arg)
+
+    def compute(stmt):
+        if stmt.bin_op is None:
+            return operand(stmt.arguments[0])
+        l, r = operand(stmt.arguments[0]), operand(stmt.arguments[1])
+        return l + r if stmt.bin_op == "+" else l - r
+
+    prev, v = None, graph.vertexes[0]
+    while True:
+        phis = [stmt for stmt in v.block if stmt.type == IR.PHI]
+        if phis:
+            j = v.pred_slots[prev]
+            values.update([(stmt.value, operand(stmt.arguments[j])) for stmt in phis])
+        condition = None
+        for stmt in v.block:
+            if stmt.type == IR.ASSIGN:
+                values[stmt.value] = compute(stmt)
+            elif stmt.type == IR.CMP:
+                condition = compute(stmt)
+            elif stmt.type == IR.RETURN:
+                return compute(stmt)
+        prev = v
+        v = v.output_vertexes[1 if condition == 0 else 0]
+
+
+def random_cfg(size, extra_edges, seed=0):
+    # Случайный граф потока управления: остовное дерево от входа плюс случайные рёбра
+    rnd = random.Random(seed)
+    context = Context()
+    builder = Builder(context)
+    vertexes = [context.graph.add_vertex() for _ in range(size)]
+    for i, v in enumerate(vertexes):
+        v.number = i
+    for i in range(1, size):
+        builder.add_connector(vertexes[rnd.randrange(max(0, i - 8), i)], vertexes[i])
+    for _ in range(extra_edges):
+        builder.add_connector(rnd.choice(vertexes), rnd.choice(vertexes[1:]))
+    return context.graph
+
+
+def assign_blocks(graph, name):
+    # Вершины с присваиванием name полным просмотром графа, эталон для индекса def_use
+    result = set()
+    for elem in graph.vertexes:
+        for stmt in elem.block:
+            if stmt.type == IR.ASSIGN and stmt.value == name:
+                result.add(elem)
+    return result
+
+
+def df_set(graph, s):
+    # Объединение DF вершин s
+    result = set()
+    for elem in s:
+        result.update(graph.DF[elem.index])
+    return {graph.vertexes[i] for i in result}
+
+
+def dfp_fixpoint(graph, s):
+    # Прежний способ размещения ф-функций, эталон для Graph.make_dfp: пересчет DF
+    # по всему растущему множеству до неподвижной точки
+    dfp = df_set(graph, s)
+    while True:
+        s = s.union(dfp)
+        new_dfp = df_set(graph, s)
+        if new_dfp == dfp:
+            return dfp
+        dfp = new_dfp
+
+
+def idoms(graph):
+    return [None if v.idom is None else v.idom.number for v in graph.vertexes]
+
+
+def dominator_state(graph):
+    return idoms(graph), [[c.number for c in v.children] for v in graph.vertexes], \
+        {i: sorted(df) for i, df in graph.DF.items() if graph.is_reachable(graph.vertexes[i])}
+
+
+def random_edits(graph, edits, rnd):
+    # Случайные вставки и удаления ребер: (True, u, v) - вставка, (False, u, v) - удаление
+    vertexes = graph.vertexes
+    result = []
+    for _ in range(edits):
+        if rnd.random() < 0.5:
+            result.append((True, rnd.choice(vertexes), rnd.choice(vertexes[1:])))
+        else:
+            u = rnd.choice([v for v in vertexes if v.output_vertexes])
+            result.append((False, u, rnd.choice(u.output_vertexes)))
+            # Удаляемое ребро сразу возвращается, чтобы граф не распадался
+            result.append((True, u, result[-1][2]))
+    return result
+
+
+def apply_edit(graph, edit):
+    insert, u, v = edit
+    if insert:
+        graph.insert_edge(u, v)
+    else:
+        graph.remove_edge(u, v)
+
+
+def loop_program(iterations):
+    # Вложенные циклы с ветвлением и ф-функциями в заголовках
+    return f"""main {{
+    n = {iterations}
+    s = 1
+    p = 1
+    while (n) {{
+        k = 3
+        while (k) {{
+            s = s + k
+            k = k - 1
+        }}
+        if (n - 5) {{ p = p + s }} else {{ p = p - 1 }}
+        n = n - 1
+    }}
+    return (s + p)
+}}"""
+
+
+def many_variables_program(variables, statements, seed=0):
+    rnd = random.Random(seed)
+    names = ["v" + "".join(rnd.choice("abcdefgh") for _ in range(6)) for _ in range(variables)]
+    return program_over(names, statements, rnd)
+
+
+def program_over(names, statements, rnd):
+    lines = ["main {"] + ["    " + name + " = " + str(i + 1) for i, name in enumerate(names)]
+    for i in range(statements):
+        target = rnd.choice(names)
+        expr = rnd.choice(names) + " + " + rnd.choice(names)
+        if i % 4 == 3:
+            lines.append("    if (" + rnd.choice(names) + ") { " + target + " = " + expr + " }")
+        else:
+            lines.append("    " + target + " = " + expr)
+    lines.append("    return " + names[0])
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def canonical_dot(graph):
+    # DOT с версиями, перенумерованными по порядку определений, и с ф-функциями блока,
+    # отсортированными по имени переменной. Повторная компиляция отличается от полной
+    # номерами версий и временных переменных, порядок ф-функций зависит от хэша строк.
+    names = {}
+    temporaries = {}
+    counters = {}
+    lines = ["digraph g{"]
+    blocks = []
+    for v in graph.vertexes:
+        phis = sorted((stmt for stmt in v.block if stmt.type == IR.PHI), key=lambda stmt: base_name(stmt.value))
+        blocks.append(phis + [stmt for stmt in v.block if stmt.type != IR.PHI])
+        for stmt in blocks[-1]:
+            if stmt.type == IR.ASSIGN or stmt.type == IR.PHI:
+                name = base_name(stmt.value)
+                if name.startswith("_t"):
+                    name = temporaries.setdefault(name, "_t" + str(len(temporaries)))
+                counters[name] = counters.get(name, -1) + 1
+                names[stmt.value] = version_name(name, counters[name])
+    for v, block in zip(graph.vertexes, blocks):
+        lines.append(str(v.number) + ":")
+        for stmt in block:
+            copy = stmt.copy()
+            copy.value = names.get(stmt.value, stmt.value)
+            copy.arguments = [names.get(arg, arg) for arg in stmt.arguments]
+            lines.append("    " + str(copy))
+        lines += [str(v.number) + "->" + str(succ.number) for succ in v.output_vertexes]
+    return "\n".join(lines + ["}"])
+
+
+def random_source_edit(text, rnd):
+    # Случайная правка строки тела программы: дописанное слагаемое, новая цель присваивания,
+    # вставка присваивания или условия, удаление присваивания
+    names = ["a", "b", "c", "d", "a1", "b11", "fresh"]
+    lines = text.split("\n")
+    i = rnd.randrange(1, len(lines) - 2)
+    line = lines[i]
+    indent = line[:len(line) - len(line.lstrip())]
+    kind = rnd.randrange(5)
+    if kind == 0 and " = " in line:
+        lines[i] = line + " + " + rnd.choice(names + ["7"])
+    elif kind == 1 and " = " in line:
+        lines[i] = indent + rnd.choice(names) + line[line.index(" = "):]
+    elif kind == 2 and " = " in line:
+        del lines[i]
+    elif kind == 3 and not line.lstrip().startswith("}"):
+        lines.insert(i, indent + rnd.choice(names) + " = " + rnd.choice(names) + " - 1")
+    elif not line.lstrip().startswith("}"):
+        lines[i:i] = [indent + "if (" + rnd.choice(names) + ") {",
+                      indent + "    " + rnd.choice(names) + " = 2",
+                      indent + "}"]
+    return "\n".join(lines)
@@ -0,0 +1,180 @@
+import IR
+
+# Значения решетки: TOP - значение еще не вычислено, BOTTOM - не константа, иначе число
+TOP = "top"
+BOTTOM = "bottom"
+
+
+def meet(a, b):
+    if a == TOP:
+        return b
+    if b == TOP or a == b:
+        return a
+    return BOTTOM
+
+
+def fold(op, l, r):
+    if op == "+":
+        return l + r
+    if op == "-":
+        return l - r
+    return BOTTOM
+
+
+# Разреженное условное распространение констант (Wegman-Zadeck) над графом в SSA-форме.
+# Блок считается исполнимым, только если в него ведет исполнимое ребро, а ф-функции
+# учитывают аргументы только с исполнимых ребер, поэтому константы находятся и в ветках,
+# которые становятся недостижимыми после вычисления условия.
+class ConstantPropagation:
+    def __init__(self, graph):
+        self.graph = graph
+        self.values = {}
+        self.executable = set()
+        self.executable_edges = set()
+        self.flow = []
+        self.ssa = []
+
+    def value(self, arg):
+        # Числа из операндов тоже запоминаются в values: имена переменных с ними не совпадают
+        value = self.values.get(arg)
+        if value is not None:
+            return value
+        if not IR.is_variable(arg):
+            value = self.values[arg] = int(arg)
+            return value
+        if self.graph.def_use.definition(arg) is None:
+            # Переменная без определения
+            return BOTTOM
+        return TOP
+
+    def operands_value(self, stmt):
+        if stmt.bin_op is None:
+            return self.value(stmt.arguments[0])
+        l = self.value(stmt.arguments[0])
+        r = self.value(stmt.arguments[1])
+        if l == BOTTOM or r == BOTTOM:
+            return BOTTOM
+        if l == TOP or r == TOP:
+            return TOP
+        return fold(stmt.bin_op, l, r)
+
+    def set_value(self, name, value):
+        if self.values.get(name, TOP) != value:
+            self.values[name] = value
+            self.ssa.extend(self.graph.def_use.uses_of(name))
+
+    def mark_edge(self, from_v, to_v):
+        edge = (from_v.index, to_v.index)
+        if edge not in self.executable_edges:
+            self.executable_edges.add(edge)
+            self.flow.append((from_v, to_v))
+
+    def evaluate(self, v, stmt):
+        if stmt.type == IR.PHI:
+            result = TOP
+            for pred, arg in zip(v.input_vertexes, stmt.arguments):
+                if (pred.index, v.index) in self.executable_edges:
+                    result = meet(result, self.value(arg))
+            self.set_value(stmt.value, result)
+        elif stmt.type == IR.ASSIGN:
+            self.set_value(stmt.value, self.operands_value(stmt))
+        elif stmt.type == IR.CMP:
+            # Первый преемник - переход при ненулевом условии
+            condition = self.operands_value(stmt)
+            if condition == TOP:
+                return
+            if condition == BOTTOM or condition != 0:
+                self.mark_edge(v, v.output_vertexes[0])
+            if condition == BOTTOM or condition == 0:
+                self.mark_edge(v, v.output_vertexes[1])
+
+    def reach(self, v):
+        # Первый вход в блок: вычисляются все операторы; без условия исполнимы все выходы
+        self.executable.add(v)
+        for stmt in v.block:
+            self.evaluate(v, stmt)
+        if not v.block or v.block[-1].type != IR.CMP:
+            for succ in v.output_vertexes:
+                self.mark_edge(v, succ)
+
+    def run(self):
+        self.reach(self.graph.vertexes[0])
+        while self.flow or self.ssa:
+            while self.flow:
+                from_v, to_v = self.flow.pop()
+                if to_v not in self.executable:
+                    self.reach(to_v)
+                    continue
+                # Новое исполнимое ребро меняет только ф-функции
+                for stmt in to_v.block:
+                    if stmt.type != IR.PHI:
+                        break
+                    self.evaluate(to_v, stmt)
+            while self.ssa:
+                v, stmt = self.ssa.pop()
+                if v in self.executable:
+                    self.evaluate(v, stmt)
+
+    def constant(self, name):
+        # Найденное значение переменной, если это константа
+        value = self.values.get(name)
+        return value if isinstance(value, int) else None
+
+    def rewrite(self):
+        # Замена константных операторов и операндов числами, удаление невыполнимых
+        # переходов и недостижимых блоков. Возвращает число свернутых операторов.
+        graph = self.graph
+        folded = 0
+        pruned = False
+        for v in graph.vertexes:
+            if v not in self.executable:
+                continue
+            phis, assigns, rest = [], [], []
+            for stmt in v.block:
+                value = None
+                if stmt.type == IR.PHI or stmt.type == IR.ASSIGN:
+                    value = self.constant(stmt.value)
+                if value is not None:
+                    if stmt.bin_op is not None or stmt.type == IR.PHI or stmt.arguments[0] != str(value):
+                        folded += 1
+                    # Ф-функция с константой становится присваиванием после остальных ф-функций
+                    (assigns if stmt.type == IR.PHI else rest).append(stmt)
+                    stmt.type = IR.ASSIGN
+                    stmt.arguments = [IR.intern(str(value))]
+                    stmt.bin_op = None
+                else:
+                    for i, arg in enumerate(stmt.arguments):
+                        number = self.constant(arg) if IR.is_variable(arg) else None
+                        if number is not None:
+                            stmt.arguments[i] = IR.intern(str(number))
+                    (phis if stmt.type == IR.PHI else rest).append(stmt)
+            v.block = phis + assigns + rest
+            if v.block and v.block[-1].type == IR.CMP:
+                condition = self.operands_value(v.block[-1])
+                if isinstance(condition, int):
+                    # Условие известно: переход становится безусловным
+                    v.block.pop()
+                    dead = v.output_vertexes[1] if condition != 0 else v.output_vertexes[0]
+                    graph.disconnect(v, dead)
+                    folded += 1
+                    pruned = True
+        dead = [v for v in graph.vertexes if v not in self.executable]
+        for v in dead:
+            for succ in list(v.output_vertexes):
+                graph.disconnect(v, succ)
+            for pred in list(v.input_vertexes):
+                graph.disconnect(pred, v)
+        if pruned or dead:
+            graph.remove_vertexes(dead)
+            graph.build_dominators_tree()
+            graph.make_DF()
+        graph.def_use.rebuild(graph.vertexes)
+        return folded
+
+
+def propagate_constants(graph):
+    # Проход SCCP; возвращает число свернутых операторов и переходов
+    graph.revision += 1
+    propagation = ConstantPropagation(graph)
+    propagation.run()
+    return propagation.rewrite()
@@ -0,0 +1,176 @@
+import argparse
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from compiler import compile_source, open_cache
+from dot import dot_string
+
+# Сервер компиляции: держит интерпретатор и процессы-исполнители прогретыми
+# и принимает запросы в формате JSON-строк:
+#   {"id": 1, "source": "main { ... }", "format": "dot" | "ssa", "passes": ["sccp"]}
+# Ответ: {"id": 1, "ok": true, "result": ...} или {"id": 1, "ok": false, "error": "..."}
+
+
+def handle(request, cache_dir=None):
+    # Обработка одного запроса; выполняется в процессе-исполнителе или на месте
+    request_id = request.get("id")
+    messages = io.StringIO()
+    try:
+        # Сообщения лексера собираются отдельно для каждого запроса: sys.stdout общий для всех потоков
+        graph = compile_source(request["source"], open_cache(cache_dir), request.get("passes", ()),
+                               messages=messages)
+        if request.get("format", "dot") == "ssa":
+            result = graph.to_dict()
+        else:
+            result = dot_string(graph)
+        return {"id": request_id, "ok": True, "result": result}
+    except Exception as e:
+        detail = " ".join(part for part in (str(e), messages.getvalue().strip()) if part)
+        return {"id": request_id, "ok": False, "error": type(e).__name__ + (": " + detail if detail else "")}
+
+
+def warm_up(_=None):
+    # Первая компиляция в процессе загружает и прогревает все модули
+    handle({"source": "main { a = 1 return a }"})
+    return os.getpid()
+
+
+class CompileService:
+    def __init__(self, jobs, cache_dir=None):
+        # jobs = 0: запросы обрабатываются в процессе сервера без передачи между процессами
+        self.cache_dir = cache_dir
+        self.executor = None
+        if jobs != 0:
+            workers = jobs or os.cpu_count() or 1
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+            # Все процессы запускаются и прогреваются до первого запроса
+            list(self.executor.map(warm_up, [None] * workers))
+        else:
+            warm_up()
+
+    def submit(self, line, reply):
+        # Разбор строки запроса; ответ передается в reply, возможно из другого потока
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict) or not isinstance(request.get("source"), str):
+                raise ValueError("request must be an object with a string 'source'")
+        except ValueError as e:
+            reply({"id": None, "ok": False, "error": "bad request: " + str(e)})
+            return
+        passes = request.get("passes", [])
+        if not isinstance(passes, list) or not all(isinstance(name, str) for name in passes):
+            reply({"id": request.get("id"), "ok": False,
+                   "error": "bad request: 'passes' must be a list of pass names"})
+            return
+        if self.executor is None:
+            reply(handle(request, self.cache_dir))
+            return
+        future = self.executor.submit(handle, request, self.cache_dir)
+        future.add_done_callback(lambda f: reply(self.result(f, request)))
+
+    @staticmethod
+    def result(future, request):
+        try:
+            return future.result()
+        except Exception as e:
+            return {"id": request.get("id"), "ok": False, "error": type(e).__name__ + ": " + str(e)}
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+class JsonLinesWriter:
+    # Потокобезопасная запись ответов по одному на строку.
+    # После ошибки записи (клиент отключился) остальные ответы отбрасываются.
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.failed = False
+        self.idle = threading.Condition(self.lock)
+
+    def expect(self):
+        with self.lock:
+            self.pending += 1
+
+    def __call__(self, response):
+        text = json.dumps(response) + "\n"
+        with self.lock:
+            try:
+                if not self.failed:
+                    self.stream.write(text)
+                    self.stream.flush()
+            except (OSError, ValueError):
+                # ValueError - запись в уже закрытый поток
+                self.failed = True
+            finally:
+                # Ожидающий wait() не должен зависнуть, даже если ответ не записан
+                self.pending -= 1
+                self.idle.notify_all()
+
+    def wait(self):
+        with self.lock:
+            self.idle.wait_for(lambda: self.pending == 0)
+
+
+def serve_stream(service, instream, outstream):
+    # Запросы читаются построчно; ответы пишутся по мере готовности и связываются по id
+    writer = JsonLinesWriter(outstream)
+    for line in instream:
+        if writer.failed:
+            break
+        if line.strip():
+            writer.expect()
+            service.submit(line, writer)
+    writer.wait()
+    return writer
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        out = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+        serve_stream(self.server.service, io.TextIOWrapper(self.rfile, encoding="utf-8"), out)
+        out.detach()
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(service, path):
+    if os.path.exists(path):
+        os.remove(path)
+    with UnixServer(path, RequestHandler) as server:
+        server.service = service
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Сервер компиляции с JSON-строками")
+    arg_parser.add_argument("--socket", help="путь к Unix-сокету; без него используются stdin/stdout")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None,
+                            help="число процессов-исполнителей, 0 - без пула")
+    arg_parser.add_argument("--cache", help="каталог кэша скомпилированных графов")
+    args = arg_parser.parse_args()
+    # SIGTERM завершает сервер штатно: сокет удаляется, пул останавливается
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    compile_service = CompileService(args.jobs, args.cache)
+    try:
+        if args.socket:
+            serve_socket(compile_service, args.socket)
+        else:
+            serve_stream(compile_service, sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        compile_service.shutdown()
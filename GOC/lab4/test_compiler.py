@@ -0,0 +1,298 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+import IR
+import binary
+from compact import CompactGraph
+from compiler import compile_source
+from defuse import DefUse
+from dot import dot_string
+from incremental import IncrementalCompiler
+from lexer import Lexer
+from native import compile_graph
+from optimize import PASSES, optimize
+from parser import Parser
+from programs import (apply_edit, assign_blocks, canonical_dot, dfp_fixpoint, dominator_state, evaluate_ast,
+                      generate_program, idoms, loop_program, many_variables_program, random_cfg, random_edits,
+                      random_program, random_source_edit, run_graph)
+from server import CompileService, serve_stream
+from vm import Program
+
+# Проверки правильности на небольших размерах; замеры времени - в bench.py.
+# Запуск: python -m unittest test_compiler (или pytest) из каталога lab4.
+SEEDS = 60
+
+
+def expected_result(text):
+    return evaluate_ast(Parser(Lexer(text + "$").tokenize()).parse_function())
+
+
+class GraphChecks(unittest.TestCase):
+    def assert_consistent(self, graph):
+        # Согласованность ребер, ф-функций и переходов
+        for v in graph.vertexes:
+            for succ in v.output_vertexes:
+                self.assertIn(v, succ.pred_slots, f"edge {v.index}->{succ.index} missing in predecessors")
+            for pred in v.input_vertexes:
+                self.assertIn(v, pred.output_vertexes, f"edge {pred.index}->{v.index} missing in successors")
+            for stmt in v.block:
+                if stmt.type == IR.PHI:
+                    self.assertEqual(len(stmt.arguments), len(v.input_vertexes), f"phi {stmt} in block {v.index}")
+            if v.block and v.block[-1].type == IR.CMP:
+                self.assertEqual(len(v.output_vertexes), 2, f"branch in block {v.index}")
+            else:
+                self.assertLessEqual(len(v.output_vertexes), 1, f"block {v.index} without a branch")
+
+
+class FrontEndTest(unittest.TestCase):
+    def test_scanner_matches_rules(self):
+        text = generate_program(300) + "$"
+        tokens = [(t.token_type, t.value, t.line, t.position) for t in Lexer(text, scanner=False).tokenize()]
+        self.assertEqual([(t.token_type, t.value, t.line, t.position) for t in Lexer(text).tokenize()], tokens)
+
+    def test_binary_operators_are_left_associative(self):
+        self.assertEqual(expected_result("main { a = 9 - 3 - 2 return a }"), 4)
+        graph = compile_source("main { a = 1 b = a - 2 - 3 + 4 return b }")
+        self.assertEqual(run_graph(graph), 0)
+
+    def test_long_expression_does_not_recurse(self):
+        text = "main { a = 1 b = " + " + ".join(["a"] * 5000) + " return b }"
+        self.assertEqual(run_graph(compile_source(text)), 5000)
+
+    def test_versions_of_digit_suffixed_names_do_not_collide(self):
+        # Версия 0 переменной a1 и версия 10 переменной a
+        text = "main { a1 = 100 a = 1 " + "a = a + 1 " * 10 + "return a1 }"
+        for passes in ((), list(PASSES)):
+            graph = compile_source(text, passes=passes)
+            self.assertEqual(run_graph(graph), 100)
+            self.assertEqual(Program.from_graph(graph).run(), 100)
+            self.assertEqual(compile_graph(graph)(), 100)
+
+    def test_random_programs_before_optimization(self):
+        for seed in range(SEEDS):
+            with self.subTest(seed=seed):
+                text = random_program(seed)
+                self.assertEqual(run_graph(compile_source(text)), expected_result(text))
+
+
+class DominatorsTest(GraphChecks):
+    def test_iterative_matches_naive(self):
+        for seed in range(100):
+            with self.subTest(seed=seed):
+                size = random.Random(seed).randint(2, 60)
+                graph = random_cfg(size, size * 2, seed)
+                graph.build_dominators_tree()
+                fast = idoms(graph)
+                graph.dfs()
+                graph.build_dominators_tree_naive()
+                # Исходный алгоритм не считает вход доминатором, там idom = None
+                naive = [v if v is not None or i == 0 else 0 for i, v in enumerate(idoms(graph))]
+                self.assertEqual(fast, naive)
+
+    def test_incremental_matches_full_recomputation(self):
+        for seed in range(40):
+            rnd = random.Random(seed)
+            size = rnd.randint(2, 40)
+            graph = random_cfg(size, size, seed)
+            graph.build_dominators_tree()
+            graph.make_DF()
+            for step, edit in enumerate(random_edits(graph, 20, rnd)):
+                with self.subTest(seed=seed, step=step):
+                    apply_edit(graph, edit)
+                    incremental = dominator_state(graph)
+                    graph.build_dominators_tree()
+                    graph.make_DF()
+                    self.assertEqual(incremental, dominator_state(graph))
+
+    def test_worklist_dfp_matches_fixpoint(self):
+        for seed in range(40):
+            rnd = random.Random(seed)
+            size = rnd.randint(2, 60)
+            graph = random_cfg(size, size, seed)
+            graph.build_dominators_tree()
+            graph.make_DF()
+            reachable = [v for v in graph.vertexes if graph.is_reachable(v)]
+            for _ in range(5):
+                s = set(rnd.sample(reachable, rnd.randint(1, len(reachable))))
+                with self.subTest(seed=seed, s=sorted(v.index for v in s)):
+                    self.assertEqual(graph.make_dfp(s), dfp_fixpoint(graph, s))
+
+
+class DefUseTest(unittest.TestCase):
+    def test_index_matches_graph_scan(self):
+        for seed in range(SEEDS):
+            graph = compile_source(random_program(seed))
+            names = {stmt.value for v in graph.vertexes for stmt in v.block if stmt.type == IR.ASSIGN}
+            for name in names:
+                with self.subTest(seed=seed, name=name):
+                    entries = graph.def_use.definitions(name)
+                    self.assertEqual({v for v, stmt in entries if stmt.type == IR.ASSIGN},
+                                     assign_blocks(graph, name))
+
+
+class PassesTest(GraphChecks):
+    def check_passes(self, passes):
+        for seed in range(SEEDS):
+            with self.subTest(passes=passes, seed=seed):
+                text = random_program(seed)
+                expected = expected_result(text)
+                graph = compile_source(text)
+                optimize(graph, passes)
+                self.assert_consistent(graph)
+                self.assertEqual(run_graph(graph), expected)
+
+    def test_sccp(self):
+        self.check_passes(["sccp"])
+
+    def test_dce(self):
+        self.check_passes(["dce"])
+        self.check_passes(["sccp", "dce"])
+
+    def test_gvn(self):
+        self.check_passes(["gvn"])
+        self.check_passes(["gvn", "dce"])
+
+    def test_copyprop(self):
+        self.check_passes(["copyprop"])
+        self.check_passes(["copyprop", "gvn", "dce"])
+
+    def test_all_passes(self):
+        self.check_passes(list(PASSES))
+
+    def test_gvn_removes_repeated_sum(self):
+        graph = compile_source("main { a = 1 b = 2 c = a + b d = b + a return (c - d) }", passes=["gvn"])
+        sums = [stmt for v in graph.vertexes for stmt in v.block if stmt.bin_op == "+"]
+        self.assertEqual(len(sums), 1)
+
+    def test_copyprop_removes_copies(self):
+        graph = compile_source("main { a = 1 b = a c = b return c }", passes=["copyprop"])
+        self.assertEqual([str(stmt) for v in graph.vertexes for stmt in v.block], ["a_0 = 1", "return a_0"])
+
+
+class ExecutionTest(unittest.TestCase):
+    def test_vm_matches_ast(self):
+        for seed in range(SEEDS):
+            text = random_program(seed)
+            expected = expected_result(text)
+            for passes in ((), list(PASSES)):
+                with self.subTest(seed=seed, passes=passes):
+                    self.assertEqual(Program.from_graph(compile_source(text, passes=passes)).run(), expected)
+
+    def test_native_matches_ast(self):
+        for seed in range(SEEDS):
+            text = random_program(seed)
+            expected = expected_result(text)
+            for passes in ((), list(PASSES)):
+                with self.subTest(seed=seed, passes=passes):
+                    self.assertEqual(compile_graph(compile_source(text, passes=passes))(), expected)
+
+    def test_loops(self):
+        graph = compile_source(loop_program(100), passes=list(PASSES))
+        expected = run_graph(graph)
+        self.assertEqual(Program.from_graph(graph).run(), expected)
+        function = compile_graph(graph)
+        self.assertIs(compile_graph(graph), function)
+        self.assertEqual([function(), function()], [expected, expected])
+
+    def test_native_follows_graph_changes(self):
+        # Граф повторной компиляции тот же объект, но функция строится заново
+        compiler = IncrementalCompiler()
+        graph = compiler.compile("main { a = 1 b = 2 c = a + b return c }")
+        self.assertEqual(compile_graph(graph)(), 3)
+        self.assertIs(compiler.compile("main { a = 1 b = 5 c = a + b return c }"), graph)
+        self.assertEqual(compile_graph(graph)(), 6)
+        function = compile_graph(graph)
+        optimize(graph)
+        self.assertIsNot(compile_graph(graph), function)
+        self.assertEqual(compile_graph(graph)(), 6)
+
+
+class RepresentationTest(unittest.TestCase):
+    def test_compact_round_trip(self):
+        graph = compile_source(many_variables_program(20, 200))
+        compact = CompactGraph.from_graph(graph)
+        self.assertEqual(dot_string(compact), dot_string(graph))
+        self.assertEqual(dot_string(compact.to_graph()), dot_string(graph))
+
+    def test_binary_round_trip(self):
+        graph = compile_source(many_variables_program(20, 200))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "graph.bin")
+            binary.dump(graph, path)
+            with binary.load(path) as mapped:
+                self.assertEqual(dot_string(mapped), dot_string(graph))
+
+    def test_truncated_binary_is_rejected(self):
+        graph = compile_source(many_variables_program(3, 10))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "graph.bin")
+            binary.dump(graph, path)
+            with open(path, "rb") as file:
+                data = file.read()
+            for size in (len(data) - 3, 101, 40, 10):
+                with self.subTest(size=size):
+                    with open(path, "wb") as file:
+                        file.write(data[:size])
+                    with self.assertRaises(ValueError):
+                        binary.load(path)
+
+
+class ServerTest(unittest.TestCase):
+    def test_disconnected_client_does_not_block(self):
+        class ClosedStream:
+            def write(self, text):
+                raise BrokenPipeError
+
+            def flush(self):
+                pass
+
+        service = CompileService(0)
+        lines = [json.dumps({"id": i, "source": "main { a = 1 return a }"}) + "\n" for i in range(3)]
+        writer = serve_stream(service, iter(lines), ClosedStream())
+        self.assertTrue(writer.failed)
+        self.assertEqual(writer.pending, 0)
+
+
+class IncrementalTest(unittest.TestCase):
+    def assert_same_state(self, graph, full):
+        # Доминаторы, DF и индекс определений исправленного графа - как у построенных заново
+        self.assertEqual([v.index for v in graph.vertexes], list(range(len(graph.vertexes))))
+        self.assertEqual(idoms(graph), idoms(full))
+        self.assertEqual([sorted(c.index for c in v.children) for v in graph.vertexes],
+                         [sorted(c.index for c in v.children) for v in full.vertexes])
+        self.assertEqual(graph.DF, full.DF)
+        rebuilt = DefUse()
+        rebuilt.rebuild(graph.vertexes)
+        for table, expected in ((graph.def_use.defs, rebuilt.defs), (graph.def_use.uses, rebuilt.uses)):
+            self.assertEqual({name: sorted(id(stmt) for v, stmt in entries) for name, entries in table.items()},
+                             {name: sorted(id(stmt) for v, stmt in entries) for name, entries in expected.items()})
+
+    def test_edits_match_full_compile(self):
+        for seed in range(30):
+            rnd = random.Random(seed)
+            compiler = IncrementalCompiler()
+            text = random_program(seed)
+            compiler.compile(text)
+            for step in range(10):
+                text = random_source_edit(text, rnd)
+                with self.subTest(seed=seed, step=step):
+                    graph = compiler.compile(text)
+                    # Правка внутри операторов не перестраивает остальные
+                    self.assertLess(compiler.rebuilt, 6)
+                    full = compile_source(text)
+                    self.assertEqual(canonical_dot(graph), canonical_dot(full))
+                    self.assert_same_state(graph, full)
+
+    def test_header_edit_rebuilds(self):
+        compiler = IncrementalCompiler()
+        compiler.compile("main { a = 1 b = a return b }")
+        graph = compiler.compile("main { a = 1 b = a return (a + b) }")
+        self.assertEqual((compiler.rebuilt, compiler.reused), (2, 0))
+        self.assertEqual(run_graph(graph), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
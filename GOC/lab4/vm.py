@@ -0,0 +1,170 @@
+import IR
+
+# Коды команд. Команда - кортеж (код, a, b, c), a, b, c - номера регистров или адреса:
+#   ADD a b c: r[a] = r[b] + r[c]      SUB a b c: r[a] = r[b] - r[c]
+#   MOV a b:   r[a] = r[b]             JMP a:     переход по адресу a
+#   JNZ a b c: переход на b, если r[a] != 0, иначе на c
+#   RET a:     результат программы r[a]
+ADD, SUB, MOV, JMP, JNZ, RET = range(6)
+NAMES = ["add", "sub", "mov", "jmp", "jnz", "ret"]
+BIN_OPS = {"+": ADD, "-": SUB}
+
+
+def sequential_moves(moves, temp):
+    # Параллельные присваивания (dst, src) ф-функций одного ребра в виде последовательных.
+    # Присваивание выполняется, когда его приемник больше никто не читает; если остались
+    # только циклы, значение одного приемника сохраняется во временном регистре temp.
+    pending = {dst: src for dst, src in moves if dst != src}
+    result = []
+    while pending:
+        sources = set(pending.values())
+        ready = [dst for dst in pending if dst not in sources]
+        if ready:
+            for dst in ready:
+                result.append((dst, pending.pop(dst)))
+            continue
+        dst = next(iter(pending))
+        result.append((temp, dst))
+        for d, s in pending.items():
+            if s == dst:
+                pending[d] = temp
+    return result
+
+
+# Программа для регистровой машины: плоский массив команд и начальное содержимое
+# регистров. Каждая версия переменной и каждое число занимают свой регистр, числа
+# записаны в регистры заранее. Ф-функции заменены присваиваниями на ребрах.
+class Program:
+    __slots__ = ("code", "registers", "slots")
+
+    def __init__(self):
+        self.code = []
+        self.registers = []
+        self.slots = {}
+
+    def slot(self, arg):
+        i = self.slots.get(arg)
+        if i is None:
+            i = self.slots[arg] = len(self.registers)
+            self.registers.append(None if IR.is_variable(arg) else int(arg))
+        return i
+
+    @staticmethod
+    def from_graph(graph):
+        program = Program()
+        code = program.code
+        temp = program.slot("_tmp_")
+        order = graph.generate_reverse_post_order()
+        start = {}
+        # Адреса переходов известны только после размещения всех блоков:
+        # (номер команды, поле, вершина) дописываются в конце
+        fixups = []
+        edges = []
+
+        def edge_moves(from_v, to_v):
+            j = to_v.pred_slots[from_v]
+            moves = [(program.slot(stmt.value), program.slot(stmt.arguments[j]))
+                     for stmt in to_v.block if stmt.type == IR.PHI]
+            return sequential_moves(moves, temp)
+
+        def compute(stmt, target=None):
+            # Значение оператора в регистре; условие и return с операцией вычисляются в temp
+            args = [program.slot(arg) for arg in stmt.arguments]
+            if stmt.bin_op is None:
+                if target is None:
+                    return args[0]
+                code.append([MOV, target, args[0], 0])
+            elif stmt.bin_op in BIN_OPS:
+                if target is None:
+                    target = temp
+                code.append([BIN_OPS[stmt.bin_op], target, args[0], args[1]])
+            else:
+                raise ValueError(f"unsupported operation {stmt.bin_op!r}")
+            return target
+
+        for i, v in enumerate(order):
+            start[v] = len(code)
+            branch = None
+            for stmt in v.block:
+                if stmt.type == IR.ASSIGN:
+                    compute(stmt, program.slot(stmt.value))
+                elif stmt.type == IR.CMP:
+                    branch = compute(stmt)
+                elif stmt.type == IR.RETURN:
+                    code.append([RET, compute(stmt), 0, 0])
+                    break
+            else:
+                successors = v.output_vertexes
+                if branch is not None:
+                    code.append([JNZ, branch, None, None])
+                    for field, succ in zip((2, 3), successors):
+                        moves = edge_moves(v, succ)
+                        if moves:
+                            # Присваивания ребра выносятся в отдельный участок после всех блоков
+                            edges.append((len(code) - 1, field, moves, succ))
+                        else:
+                            fixups.append((len(code) - 1, field, succ))
+                elif successors:
+                    succ = successors[0]
+                    for dst, src in edge_moves(v, succ):
+                        code.append([MOV, dst, src, 0])
+                    # Переход на следующий по порядку блок не нужен
+                    if i + 1 == len(order) or order[i + 1] is not succ:
+                        code.append([JMP, None, 0, 0])
+                        fixups.append((len(code) - 1, 1, succ))
+                else:
+                    raise ValueError(f"block {v.number} has no return and no successors")
+        for pc, field, moves, succ in edges:
+            code[pc][field] = len(code)
+            for dst, src in moves:
+                code.append([MOV, dst, src, 0])
+            code.append([JMP, None, 0, 0])
+            fixups.append((len(code) - 1, 1, succ))
+        for pc, field, v in fixups:
+            code[pc][field] = start[v]
+        program.code = [tuple(instruction) for instruction in code]
+        return program
+
+    def run(self):
+        # Цикл выборки команд; коды сравниваются с локальными константами
+        add, sub, mov, jmp, jnz = ADD, SUB, MOV, JMP, JNZ
+        code = self.code
+        r = self.registers[:]
+        pc = 0
+        while True:
+            op, a, b, c = code[pc]
+            pc += 1
+            if op == add:
+                r[a] = r[b] + r[c]
+            elif op == sub:
+                r[a] = r[b] - r[c]
+            elif op == mov:
+                r[a] = r[b]
+            elif op == jnz:
+                pc = b if r[a] != 0 else c
+            elif op == jmp:
+                pc = a
+            else:
+                return r[a]
+
+    def listing(self):
+        names = {i: name for name, i in self.slots.items()}
+        lines = []
+        for pc, (op, a, b, c) in enumerate(self.code):
+            if op == JMP:
+                operands = [str(a)]
+            elif op == JNZ:
+                operands = [names[a], str(b), str(c)]
+            elif op == RET:
+                operands = [names[a]]
+            elif op == MOV:
+                operands = [names[a], names[b]]
+            else:
+                operands = [names[a], names[b], names[c]]
+            lines.append(f"{pc}: {NAMES[op]} " + ", ".join(operands))
+        return "\n".join(lines)
+
+
+def execute(graph):
+    # Исполнение графа в SSA-форме; возвращает результат return
+    return Program.from_graph(graph).run()